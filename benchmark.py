@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+from code_exporter import (
+    ProjectScanner, ScanRules, PerfRecorder, iter_files, selection_totals,
+    write_structure, write_contents, DEFAULT_EXCLUDE_FOLDERS
+)
+
+# Estensioni usate dal generatore di progetti sintetici
+SOURCE_EXTENSIONS = ['.py', '.js', '.ts', '.tsx', '.md', '.json', '.css', '.yml']
+BINARY_EXTENSIONS = ['.png', '.jpg', '.zip', '.pdf', '.so']
+
+SOURCE_LINES = [
+    "import os",
+    "def handler(request, context=None):",
+    "    value = compute(request.payload, retries=3)",
+    "    # TODO: gestire il caso limite",
+    "    return {'status': 200, 'body': value}",
+    "class Service(object):",
+    "    def __init__(self, name):",
+    "        self.name = name",
+    "",
+]
+
+# Generatore di progetti sintetici con forma configurabile
+def generate_project(root, depth=4, fanout=4, files_per_dir=12, min_size=200, max_size=8000,
+                     excluded_share=0.1, binary_share=0.05, seed=42):
+    rng = random.Random(seed)
+    root = Path(root)
+    stats = {"dirs": 0, "files": 0, "bytes": 0}
+
+    def write_file(path, size, binary):
+        if binary:
+            data = bytes(rng.getrandbits(8) for _ in range(min(size, 4096)))
+        else:
+            lines = []
+            length = 0
+            while length < size:
+                line = rng.choice(SOURCE_LINES)
+                lines.append(line)
+                length += len(line) + 1
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+        path.write_bytes(data)
+        stats["files"] += 1
+        stats["bytes"] += len(data)
+
+    def fill(folder, level):
+        folder.mkdir(parents=True, exist_ok=True)
+        stats["dirs"] += 1
+        for index in range(files_per_dir):
+            binary = rng.random() < binary_share
+            extension = rng.choice(BINARY_EXTENSIONS if binary else SOURCE_EXTENSIONS)
+            write_file(folder / f"file_{index}{extension}", rng.randint(min_size, max_size), binary)
+        if level >= depth:
+            return
+        for index in range(fanout):
+            if rng.random() < excluded_share:
+                excluded = folder / rng.choice(DEFAULT_EXCLUDE_FOLDERS)
+                if not excluded.exists():
+                    # Le cartelle escluse non hanno sottocartelle: servono a verificare che vengano saltate
+                    fill(excluded, depth)
+            else:
+                fill(folder / f"dir_{index}", level + 1)
+
+    fill(root, 0)
+    return stats
+
+def measure(function, repeat):
+    # Esegue la funzione `repeat` volte e restituisce i tempi e l'ultimo risultato
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+def summarize(timings, **extra):
+    summary = {
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.mean(timings),
+        "runs": len(timings)
+    }
+    summary.update(extra)
+    return summary
+
+def run_benchmarks(project_root, output_dir, repeat):
+    project_root = Path(project_root)
+    perf = PerfRecorder()
+    scanner = ProjectScanner(ScanRules(), perf)
+    results = {}
+
+    timings, total_files = measure(lambda: scanner.count_files(project_root), repeat)
+    results["scan.count_files"] = summarize(timings, files=total_files)
+
+    timings, tree = measure(lambda: scanner.build_tree(project_root), repeat)
+    root_node, excluded_count, selected_count, total_size = tree
+    results["scan.build_tree"] = summarize(
+        timings,
+        entries=selected_count + excluded_count,
+        entries_per_s=(selected_count + excluded_count) / min(timings)
+    )
+
+    selected_nodes = [node for node in iter_files(root_node) if not node.is_excluded]
+    timings, totals = measure(lambda: selection_totals(selected_nodes), repeat)
+    results["selection.aggregate"] = summarize(timings, files=totals[0], bytes=totals[1])
+
+    structure_path = os.path.join(output_dir, "structure.txt")
+
+    def export_structure():
+        with open(structure_path, 'w', encoding='utf-8') as f:
+            write_structure(f, root_node, selected_nodes)
+        return os.path.getsize(structure_path)
+
+    timings, written = measure(export_structure, repeat)
+    results["export.structure"] = summarize(timings, bytes_written=written)
+
+    content_path = os.path.join(output_dir, "content.txt")
+
+    def export_content():
+        with open(content_path, 'wb') as f:
+            write_contents(f, selected_nodes, project_root)
+        return os.path.getsize(content_path)
+
+    timings, written = measure(export_content, repeat)
+    results["export.content"] = summarize(
+        timings,
+        bytes_written=written,
+        bytes_per_s=written / min(timings)
+    )
+    return results
+
+def compare(results, baseline_path):
+    # Confronta i tempi minimi con un file di risultati precedente
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)["results"]
+    print(f"\n{'benchmark':<24} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, result in results.items():
+        if name in baseline:
+            before, after = baseline[name]["min_s"], result["min_s"]
+            print(f"{name:<24} {before * 1000:>10.1f}ms {after * 1000:>10.1f}ms {after / before:>7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Code Exporter scan and export paths on a synthetic project")
+    parser.add_argument("--depth", type=int, default=4, help="folder nesting depth")
+    parser.add_argument("--fanout", type=int, default=4, help="subfolders per folder")
+    parser.add_argument("--files-per-dir", type=int, default=12, help="files per folder")
+    parser.add_argument("--min-size", type=int, default=200, help="minimum file size in bytes")
+    parser.add_argument("--max-size", type=int, default=8000, help="maximum file size in bytes")
+    parser.add_argument("--excluded-share", type=float, default=0.1, help="share of subfolders named like excluded folders")
+    parser.add_argument("--binary-share", type=float, default=0.05, help="share of binary files")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for the generator")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark")
+    parser.add_argument("--project", help="benchmark an existing folder instead of generating one")
+    parser.add_argument("--output", default="benchmark_results.json", help="machine-readable results file")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the generated project")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="code_exporter_bench_")
+    try:
+        shape = None
+        if args.project:
+            project_root = args.project
+        else:
+            project_root = os.path.join(work_dir, "project")
+            shape = {
+                "depth": args.depth,
+                "fanout": args.fanout,
+                "files_per_dir": args.files_per_dir,
+                "min_size": args.min_size,
+                "max_size": args.max_size,
+                "excluded_share": args.excluded_share,
+                "binary_share": args.binary_share,
+                "seed": args.seed
+            }
+            print(f"Generating synthetic project in {project_root}...")
+            generated = generate_project(project_root, **shape)
+            shape.update(generated)
+            print(f"  {generated['dirs']} folders, {generated['files']} files, {generated['bytes']} bytes")
+
+        results = run_benchmarks(project_root, work_dir, args.repeat)
+
+        for name, result in results.items():
+            print(f"{name:<24} min {result['min_s'] * 1000:>9.1f} ms   median {result['median_s'] * 1000:>9.1f} ms")
+
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": {
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count()
+            },
+            "project": shape or {"path": os.path.abspath(project_root)},
+            "repeat": args.repeat,
+            "results": results
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+        if args.compare:
+            compare(results, args.compare)
+    finally:
+        if args.keep:
+            print(f"Generated files kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,2410 @@
+import time
+# Riferimento per misurare il tempo di avvio (prima di tutti gli altri import)
+_STARTUP_TIME = time.perf_counter()
+
 import os
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, font
 from pathlib import Path
 import threading
 import queue
-import time
 import sys
+import re
+import json
+import shutil
+import codecs
+import importlib.util
+from contextlib import contextmanager
+from operator import itemgetter
+
+# I moduli usati solo da alcune funzioni (subprocess, hashlib, concurrent.futures)
+# vengono importati quando servono, per non rallentare l'import del modulo.
+# customtkinter viene importato solo per l'interfaccia, prima di creare la finestra
+
+# tkinter serve solo all'interfaccia: senza python3-tk restano disponibili
+# --batch, --serve, benchmark.py e i processi del pool
+try:
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox, simpledialog
+except ImportError:
+    tk = None
+
+if tk is not None:
+    # Classe per le label colorate
+    class ColoredLabel(tk.Label):
+        def __init__(self, master=None, **kwargs):
+            self.emoji = kwargs.pop("emoji", None)
+            super().__init__(master, **kwargs)
+        
+        def update_colors(self):
+            if hasattr(self, "app") and self.app and self.emoji:
+                self.configure(fg=self.app.theme.get_emoji_color(self.emoji))
+
+# Classe Node per la struttura ad albero
+class Node:
+    def __init__(self, name, path, is_excluded, is_dir, size=0, mtime=0):
+        self.name = name
+        self.path = path
+        self.is_excluded = is_excluded
+        self.is_dir = is_dir
+        # Dimensione e data di modifica catturate durante la scansione
+        self.size = size
+        self.mtime = mtime
+        # Stima dei token (None finché non è stata calcolata)
+        self.tokens = None
+        self.children = []
+
+# Espressioni per la stima euristica dei token
+_TOKEN_WORD_RE = re.compile(rb"[A-Za-z0-9_]+")
+_TOKEN_SYMBOL_RE = re.compile(rb"[^A-Za-z0-9_\s]")
+_TOKEN_WHITESPACE = b" \t\r\n\x0b\x0c"
+
+def estimate_tokens(data):
+    # Euristica veloce: ogni simbolo è un token, le parole contano almeno
+    # un token ciascuna e circa un token ogni 4 caratteri alfanumerici
+    if not data:
+        return 0
+    words = len(_TOKEN_WORD_RE.findall(data))
+    symbols = len(_TOKEN_SYMBOL_RE.findall(data))
+    alnum = len(data.translate(None, _TOKEN_WHITESPACE)) - symbols
+    return symbols + max(words, (alnum + 3) // 4)
+
+def load_tiktoken_tokenizer(encoding_name="cl100k_base"):
+    # Tokenizer esatto opzionale: restituisce None se tiktoken non è installato
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    encoding = tiktoken.get_encoding(encoding_name)
+    return lambda data: len(encoding.encode(data.decode("utf-8", errors="replace"), disallowed_special=()))
+
+def format_tokens(tokens):
+    if tokens < 1000:
+        return str(tokens)
+    elif tokens < 1000 * 1000:
+        return f"{tokens / 1000:.1f}K"
+    else:
+        return f"{tokens / (1000 * 1000):.2f}M"
+
+# Stima dei token con cache per (percorso, mtime, dimensione) e pool di worker
+class TokenEstimator:
+    # Oltre questa dimensione il file non viene letto e si stima dai byte
+    MAX_READ_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or min(8, (os.cpu_count() or 1) + 2)
+        self.exact_tokenizer = None
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def set_exact_tokenizer(self, tokenizer):
+        # tokenizer: funzione bytes -> numero di token (None per l'euristica)
+        self.exact_tokenizer = tokenizer
+        with self.lock:
+            self.cache.clear()
+
+    @property
+    def is_exact(self):
+        return self.exact_tokenizer is not None
+
+    def estimate_file(self, path, mtime, size):
+        # Il tokenizer fa parte della chiave: una stima euristica ancora in corso
+        # quando si passa al conteggio esatto non finisce tra quelle esatte
+        tokenizer = self.exact_tokenizer
+        key = (tokenizer, str(path), mtime, size)
+        with self.lock:
+            tokens = self.cache.get(key)
+        if tokens is not None:
+            return tokens
+        
+        if size > self.MAX_READ_SIZE:
+            tokens = (size + 3) // 4
+        else:
+            try:
+                with open(path, 'rb') as source:
+                    data = source.read()
+            except OSError:
+                return 0
+            if tokenizer is not None:
+                tokens = tokenizer(data)
+            else:
+                tokens = estimate_tokens(data)
+        
+        with self.lock:
+            self.cache[key] = tokens
+        return tokens
+
+    def estimate_nodes(self, nodes, on_progress=None, is_cancelled=None, progress_interval=1.0):
+        # Calcola i token dei nodi nel pool, assegnando node.tokens;
+        # on_progress viene chiamato al massimo una volta ogni progress_interval secondi
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tokens")
+        
+        def work(node):
+            if is_cancelled and is_cancelled():
+                return
+            node.tokens = self.estimate_file(node.path, node.mtime, node.size)
+        
+        done = 0
+        last_progress = time.monotonic()
+        for _ in self.executor.map(work, nodes):
+            done += 1
+            if on_progress and time.monotonic() - last_progress >= progress_interval:
+                last_progress = time.monotonic()
+                on_progress(done, len(nodes))
+        if on_progress:
+            on_progress(done, len(nodes))
+
+class ContentSearch:
+    # Ricerca regex nel contenuto dei file scansionati. Il modulo re tiene il GIL per
+    # tutta la ricerca, quindi con molti dati i file vanno a un pool di processi in
+    # lotti; i conteggi restano in cache nel processo principale per
+    # (pattern, percorso, mtime, dimensione) tra una ricerca e l'altra
+    MMAP_MIN_SIZE = 1024 * 1024
+    MAX_MATCHES = 1000
+    MAX_PATTERNS = 16
+    # Sotto questa soglia avviare il pool costa più della ricerca stessa
+    PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+    BATCH_FILES = 64
+    BATCH_BYTES = 1024 * 1024
+
+    def __init__(self, max_workers=None):
+        from collections import OrderedDict
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def count_matches(cls, regex, path, size):
+        # I file grandi vengono mappati in memoria invece di essere copiati
+        with open(path, 'rb') as source:
+            if size >= cls.MMAP_MIN_SIZE:
+                import mmap
+                with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return cls._count(regex, data)
+            return cls._count(regex, source.read())
+
+    @classmethod
+    def _count(cls, regex, data):
+        count = 0
+        for _ in regex.finditer(data):
+            count += 1
+            if count >= cls.MAX_MATCHES:
+                break
+        return count
+
+    @classmethod
+    def count_batch(cls, pattern, files):
+        # Occorrenze in un lotto di (percorso, dimensione); eseguibile in un processo del pool
+        regex = re.compile(pattern.encode('utf-8'), re.MULTILINE)
+        counts = []
+        for path, size in files:
+            try:
+                counts.append(cls.count_matches(regex, path, size))
+            except (OSError, ValueError):
+                counts.append(0)
+        return counts
+
+    def _batches(self, nodes):
+        batch = []
+        batch_bytes = 0
+        for node in nodes:
+            batch.append(node)
+            batch_bytes += node.size
+            if len(batch) >= self.BATCH_FILES or batch_bytes >= self.BATCH_BYTES:
+                yield batch
+                batch = []
+                batch_bytes = 0
+        if batch:
+            yield batch
+
+    def search(self, pattern, nodes, on_hits=None, is_cancelled=None, hits_interval=0.1):
+        # Cerca pattern nei file dei nodi e restituisce [(nodo, occorrenze)] per quelli che
+        # corrispondono; on_hits riceve i nuovi risultati al massimo ogni hits_interval secondi
+        re.compile(pattern.encode('utf-8'), re.MULTILINE)  # Un pattern non valido fallisce subito
+        with self.lock:
+            cache = self.results.setdefault(pattern, {})
+            self.results.move_to_end(pattern)
+            while len(self.results) > self.MAX_PATTERNS:
+                self.results.popitem(last=False)
+        
+        hits = []
+        pending = []
+        last_hits = time.monotonic()
+        
+        def collect(batch, counts):
+            nonlocal pending, last_hits
+            with self.lock:
+                for node, count in zip(batch, counts):
+                    cache[(str(node.path), node.mtime, node.size)] = count
+            for node, count in zip(batch, counts):
+                if count:
+                    hits.append((node, count))
+                    pending.append((node, count))
+            if on_hits and pending and time.monotonic() - last_hits >= hits_interval:
+                last_hits = time.monotonic()
+                on_hits(pending)
+                pending = []
+        
+        # I file già in cache non vengono riletti
+        todo = []
+        cached_nodes = []
+        cached_counts = []
+        with self.lock:
+            for node in nodes:
+                count = cache.get((str(node.path), node.mtime, node.size))
+                if count is None:
+                    todo.append(node)
+                else:
+                    cached_nodes.append(node)
+                    cached_counts.append(count)
+        collect(cached_nodes, cached_counts)
+        
+        if self.max_workers == 1 or sum(node.size for node in todo) < self.PARALLEL_MIN_BYTES:
+            for batch in self._batches(todo):
+                if is_cancelled and is_cancelled():
+                    break
+                collect(batch, self.count_batch(pattern, [(node.path, node.size) for node in batch]))
+        else:
+            # Al massimo due lotti in anticipo per worker, nell'ordine dei nodi
+            from concurrent.futures import ProcessPoolExecutor
+            from collections import deque
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                window = deque()
+                for batch in self._batches(todo):
+                    if is_cancelled and is_cancelled():
+                        break
+                    window.append((batch, executor.submit(self.count_batch, pattern, [(str(node.path), node.size) for node in batch])))
+                    if len(window) >= self.max_workers * 2:
+                        batch, future = window.popleft()
+                        collect(batch, future.result())
+                while window:
+                    batch, future = window.popleft()
+                    if is_cancelled and is_cancelled():
+                        future.cancel()
+                        continue
+                    collect(batch, future.result())
+        
+        if on_hits and pending:
+            on_hits(pending)
+        return hits
+
+def aggregate_tokens(node):
+    # Somma i token dei file inclusi per ogni cartella (ricorsivo)
+    if not node.is_dir:
+        if node.is_excluded:
+            return 0
+        return node.tokens or 0
+    total = 0
+    for child in node.children:
+        total += aggregate_tokens(child)
+    node.tokens = total
+    return total
+
+def iter_files(node):
+    # Generatore dei nodi file (non cartelle) sotto un nodo
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.is_dir:
+            stack.extend(reversed(current.children))
+        else:
+            yield current
+
+def iter_relative_files(node):
+    # Come iter_files, ma con il percorso relativo ("src/app.py") costruito dai nomi dei nodi
+    stack = [(child, child.name) for child in reversed(node.children)]
+    while stack:
+        current, relative = stack.pop()
+        if current.is_dir:
+            stack.extend((child, relative + "/" + child.name) for child in reversed(current.children))
+        else:
+            yield relative, current
+
+# Profili di selezione salvati per progetto: pattern e percorsi relativi, mai ID della Treeview
+PROFILES_PATH = os.path.join(os.path.expanduser("~"), ".code-exporter-profiles.json")
+
+def compile_patterns(patterns):
+    # Un'unica regex per tutti i pattern: quelli senza "/" valgono per il nome del file,
+    # gli altri per il percorso relativo ("*" attraversa anche le cartelle)
+    import fnmatch
+    name_patterns = [fnmatch.translate(pattern) for pattern in patterns if "/" not in pattern]
+    path_patterns = [fnmatch.translate(pattern.strip("/")) for pattern in patterns if "/" in pattern]
+    name_match = re.compile("|".join(name_patterns)).match if name_patterns else None
+    path_match = re.compile("|".join(path_patterns)).match if path_patterns else None
+    return name_match, path_match
+
+class SelectionProfile:
+    def __init__(self, include=None, exclude=None, paths=None):
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.paths = list(paths or [])
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("include"), data.get("exclude"), data.get("paths"))
+
+    def to_dict(self):
+        return {"include": self.include, "exclude": self.exclude, "paths": self.paths}
+
+    @classmethod
+    def from_selection(cls, root_node, selected_nodes, include=None, exclude=None):
+        # I file selezionati diventano percorsi espliciti
+        chosen = set(id(node) for node in selected_nodes)
+        paths = [relative for relative, node in iter_relative_files(root_node) if id(node) in chosen]
+        return cls(include, exclude, paths)
+
+    def match(self, root_node):
+        # Un solo passaggio sul modello della scansione: un set per i percorsi espliciti
+        # e una regex per tipo di pattern. Exclude vale anche per i percorsi espliciti
+        paths = set(self.paths)
+        include_name, include_path = compile_patterns(self.include)
+        exclude_name, exclude_path = compile_patterns(self.exclude)
+        has_include = include_name is not None or include_path is not None
+        chosen = []
+        for relative, node in iter_relative_files(root_node):
+            if node.is_excluded:
+                continue
+            if (exclude_name and exclude_name(node.name)) or (exclude_path and exclude_path(relative)):
+                continue
+            if relative in paths or (has_include and ((include_name and include_name(node.name))
+                                                      or (include_path and include_path(relative)))):
+                chosen.append(node)
+        return chosen
+
+def load_profiles(project_key, profiles_path=PROFILES_PATH):
+    # Profili salvati per un progetto (chiave: percorso della cartella o del workspace)
+    try:
+        with open(profiles_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    profiles = data.get(project_key, {}) if isinstance(data, dict) else {}
+    return {name: SelectionProfile.from_dict(profile) for name, profile in profiles.items()}
+
+def save_profile(project_key, name, profile, profiles_path=PROFILES_PATH):
+    try:
+        with open(profiles_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    data.setdefault(project_key, {})[name] = profile.to_dict()
+    
+    # Scrittura atomica: un file troncato farebbe perdere i profili di tutti i progetti
+    temp_path = profiles_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, profiles_path)
+
+# Regole di priorità per la selezione automatica con budget
+class SelectionRules:
+    DEFAULT_EXTENSION_WEIGHTS = {
+        '.py': 3.0, '.js': 3.0, '.ts': 3.0, '.tsx': 3.0, '.jsx': 3.0,
+        '.html': 2.0, '.css': 1.5, '.md': 1.5, '.yml': 1.0, '.yaml': 1.0,
+        '.json': 0.7, '.ini': 0.7, '.cfg': 0.7, '.conf': 0.7, '.env': 0.5,
+        '.xml': 0.5, '.txt': 0.5, '.csv': 0.2
+    }
+
+    def __init__(self, extension_weights=None, default_weight=1.0, depth_penalty=0.15,
+                 recency_weight=1.0, recency_half_life_days=30.0):
+        self.extension_weights = dict(self.DEFAULT_EXTENSION_WEIGHTS)
+        if extension_weights:
+            self.extension_weights.update(extension_weights)
+        self.default_weight = default_weight
+        # Penalità per ogni livello di profondità nel percorso
+        self.depth_penalty = depth_penalty
+        # Bonus per i file modificati di recente (dimezzato ogni half_life giorni)
+        self.recency_weight = recency_weight
+        self.recency_half_life = recency_half_life_days * 86400.0
+
+    @classmethod
+    def from_dict(cls, data, base=None):
+        # Regole da un dizionario ("selection_rules" in PROJECT_RULES_FILE o in un job);
+        # le chiavi assenti vengono prese da base, i pesi delle estensioni si sommano
+        base = base or cls()
+        values = base.to_dict()
+        if not isinstance(data, dict):
+            raise ValueError(f"Invalid selection rules: {data!r}")
+        weights = data.get("extension_weights", {})
+        if not isinstance(weights, dict):
+            raise ValueError(f"Invalid extension weights: {weights!r}")
+        values["extension_weights"].update((extension.lower(), float(weight)) for extension, weight in weights.items())
+        for key in ("default_weight", "depth_penalty", "recency_weight", "recency_half_life_days"):
+            if key in data:
+                values[key] = float(data[key])
+        if values["recency_half_life_days"] <= 0:
+            raise ValueError("recency_half_life_days must be positive")
+        return cls(**values)
+
+    def to_dict(self):
+        return {
+            "extension_weights": dict(self.extension_weights),
+            "default_weight": self.default_weight,
+            "depth_penalty": self.depth_penalty,
+            "recency_weight": self.recency_weight,
+            "recency_half_life_days": self.recency_half_life / 86400.0
+        }
+
+    def priority(self, node, depth, now):
+        dot = node.name.rfind('.')
+        extension = node.name[dot:].lower() if dot > 0 else ''
+        weight = self.extension_weights.get(extension, self.default_weight)
+        if weight <= 0:
+            return 0.0
+        recency = 0.0
+        if node.mtime and now > node.mtime:
+            recency = 0.5 ** ((now - node.mtime) / self.recency_half_life)
+        elif node.mtime:
+            recency = 1.0
+        return weight * (1.0 + self.recency_weight * recency) / (1.0 + self.depth_penalty * depth)
+
+def parse_budget(text):
+    # Converte "500KB", "2 MB", "100k tokens", "8000 tok" in (quantità, unità)
+    match = re.fullmatch(r"\s*([0-9]+(?:\.[0-9]+)?)\s*([a-zA-Z]*)\s*(tokens?|tok)?\s*", text or "")
+    if not match:
+        raise ValueError(f"Invalid budget: {text!r}")
+    value, suffix, tokens_word = float(match.group(1)), match.group(2).lower(), match.group(3)
+    if suffix in ("tokens", "token", "tok"):
+        suffix, tokens_word = "", suffix
+    if tokens_word:
+        multipliers = {"": 1, "k": 1000, "m": 1000 * 1000}
+        unit = "tokens"
+    else:
+        multipliers = {"": 1, "b": 1, "bytes": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2, "g": 1024 ** 3, "gb": 1024 ** 3}
+        unit = "bytes"
+    if suffix not in multipliers:
+        raise ValueError(f"Invalid budget unit: {text!r}")
+    return int(value * multipliers[suffix]), unit
+
+def node_cost(node, unit):
+    if unit == "tokens":
+        # Se la stima non è ancora pronta si usa circa un token ogni 4 byte
+        return node.tokens if node.tokens is not None else (node.size + 3) // 4
+    return node.size
+
+def auto_select(root_node, budget, unit="bytes", rules=None, now=None, candidates_only=None):
+    # Selezione greedy per il problema dello zaino: ordina i file per
+    # priorità/costo e li aggiunge finché rientrano nel budget; il risultato
+    # viene confrontato con il miglior file singolo (garanzia 1/2-approssimata).
+    # candidates_only limita la scelta a un sottoinsieme dei file
+    rules = rules or SelectionRules()
+    allowed = set(id(node) for node in candidates_only) if candidates_only is not None else None
+    now = now or time.time()
+    priority = rules.priority
+    candidates = []
+    stack = [(root_node, -1)]
+    while stack:
+        node, depth = stack.pop()
+        if node.is_dir:
+            for child in node.children:
+                stack.append((child, depth + 1))
+        elif not node.is_excluded and (allowed is None or id(node) in allowed):
+            cost = node_cost(node, unit)
+            if cost <= budget:
+                value = priority(node, depth, now)
+                if value > 0:
+                    candidates.append((value / (cost or 1), value, cost, node))
+    
+    candidates.sort(key=itemgetter(0), reverse=True)
+    chosen = []
+    used = 0
+    chosen_value = 0.0
+    best = None
+    for candidate in candidates:
+        density, value, cost, node = candidate
+        if best is None or value > best[1]:
+            best = candidate
+        if used + cost <= budget:
+            chosen.append(node)
+            used += cost
+            chosen_value += value
+    
+    if best is not None and best[1] > chosen_value:
+        return [best[3]], best[2]
+    return chosen, used
+
+def selection_totals(nodes):
+    # Numero di file, byte e token di una selezione (e file con token ancora da stimare)
+    count = 0
+    size = 0
+    tokens = 0
+    pending = 0
+    for node in nodes:
+        count += 1
+        size += node.size
+        if node.tokens is None:
+            pending += 1
+        else:
+            tokens += node.tokens
+    return count, size, tokens, pending
+
+def write_structure(f, root_node, selected_nodes, size_limit=None):
+    # Scrive la struttura dell'albero marcando i file selezionati
+    # (e quelli che il limite di dimensione taglierà nell'esportazione)
+    selected = set(id(node) for node in selected_nodes)
+    f.write("PROJECT STRUCTURE\n")
+    f.write("="*50 + "\n\n")
+    
+    # Visita iterativa in preordine: (nodo, livello)
+    stack = [(root_node, 0)] if root_node is not None else []
+    while stack:
+        node, level = stack.pop()
+        indent = "  " * level
+        if node.is_dir:
+            f.write(f"{indent}📁 {node.name}/\n")
+            stack.extend((child, level + 1) for child in reversed(node.children))
+        else:
+            status = "✅" if id(node) in selected else "❌"
+            if size_limit is not None and id(node) in selected and size_limit.exceeds(node):
+                status += f" ✂️ {size_limit.label()} ({node.size} bytes)"
+            f.write(f"{indent}📄 {node.name} {status}\n")
+
+def format_size(size_bytes):
+    if size_bytes < 1024:
+        return f"{size_bytes} bytes"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.2f} KB"
+    elif size_bytes < 1024 * 1024 * 1024:
+        return f"{size_bytes / (1024 * 1024):.2f} MB"
+    else:
+        return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
+
+# Nomi dei linguaggi per i riepiloghi della struttura (le altre estensioni restano tali)
+LANGUAGE_NAMES = {
+    '.py': 'Python', '.pyw': 'Python', '.js': 'JavaScript', '.jsx': 'JavaScript', '.mjs': 'JavaScript',
+    '.cjs': 'JavaScript', '.ts': 'TypeScript', '.tsx': 'TypeScript', '.html': 'HTML', '.htm': 'HTML',
+    '.css': 'CSS', '.scss': 'SCSS', '.less': 'Less', '.md': 'Markdown', '.json': 'JSON', '.yml': 'YAML',
+    '.yaml': 'YAML', '.toml': 'TOML', '.xml': 'XML', '.sql': 'SQL', '.sh': 'Shell', '.bash': 'Shell',
+    '.c': 'C', '.h': 'C', '.cpp': 'C++', '.hpp': 'C++', '.cc': 'C++', '.cs': 'C#', '.java': 'Java',
+    '.kt': 'Kotlin', '.go': 'Go', '.rs': 'Rust', '.rb': 'Ruby', '.php': 'PHP', '.swift': 'Swift',
+    '.vue': 'Vue', '.svelte': 'Svelte', '.txt': 'Text', '.csv': 'CSV'
+}
+
+def node_language(node):
+    extension = os.path.splitext(node.name)[1].lower()
+    return LANGUAGE_NAMES.get(extension, extension or "(none)")
+
+def folder_rollups(root_node):
+    # Per ogni cartella (per id del nodo): file inclusi, dimensione e file per linguaggio.
+    # Visita iterativa in postordine, solo con i dati raccolti dalla scansione
+    rollups = {}
+    stack = [(root_node, False)] if root_node is not None and root_node.is_dir else []
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children if child.is_dir)
+            continue
+        files, size, languages = 0, 0, {}
+        for child in node.children:
+            if child.is_dir:
+                rollup = rollups[id(child)]
+                files += rollup["files"]
+                size += rollup["size"]
+                for language, count in rollup["languages"].items():
+                    languages[language] = languages.get(language, 0) + count
+            elif not child.is_excluded:
+                files += 1
+                size += child.size
+                language = node_language(child)
+                languages[language] = languages.get(language, 0) + 1
+        rollups[id(node)] = {"files": files, "size": size, "languages": languages}
+    return rollups
+
+def format_languages(languages, limit=3):
+    # "Python 60%, Markdown 30%, +2" per i linguaggi più frequenti di una cartella
+    total = sum(languages.values())
+    if not total:
+        return ""
+    ranked = sorted(languages.items(), key=lambda item: (-item[1], item[0]))
+    text = ", ".join(f"{language} {count * 100 // total}%" for language, count in ranked[:limit])
+    if len(ranked) > limit:
+        text += f", +{len(ranked) - limit}"
+    return text
+
+def write_structure_tree(f, root_node, selected_nodes, size_limit=None):
+    # Struttura in stile `tree`, con file, dimensione e linguaggi di ogni cartella
+    selected = set(id(node) for node in selected_nodes)
+    rollups = folder_rollups(root_node)
+    if root_node is None:
+        return
+    
+    def describe(node):
+        if node.is_dir:
+            rollup = rollups[id(node)]
+            languages = format_languages(rollup["languages"])
+            details = f"{rollup['files']} files, {format_size(rollup['size'])}"
+            return f"📁 {node.name}/  ({details}{'; ' + languages if languages else ''})"
+        status = "✅" if id(node) in selected else "❌"
+        if size_limit is not None and id(node) in selected and size_limit.exceeds(node):
+            status += f" ✂️ {size_limit.label()}"
+        return f"📄 {node.name}  ({format_size(node.size)}) {status}"
+    
+    f.write(describe(root_node) + "\n")
+    # Visita iterativa: (nodo, prefisso delle righe, ultimo figlio del padre)
+    stack = [(child, "", index == 0) for index, child in enumerate(reversed(root_node.children))]
+    while stack:
+        node, prefix, is_last = stack.pop()
+        f.write(f"{prefix}{'└── ' if is_last else '├── '}{describe(node)}\n")
+        if node.is_dir:
+            child_prefix = prefix + ("    " if is_last else "│   ")
+            stack.extend((child, child_prefix, index == 0) for index, child in enumerate(reversed(node.children)))
+
+def write_structure_json(f, root_node, selected_nodes, size_limit=None):
+    # Struttura come JSON annidato con i riepiloghi per cartella
+    selected = set(id(node) for node in selected_nodes)
+    rollups = folder_rollups(root_node)
+    
+    def entry(node):
+        if node.is_dir:
+            rollup = rollups[id(node)]
+            return {"name": node.name, "type": "folder", "files": rollup["files"], "size": rollup["size"],
+                    "languages": rollup["languages"], "children": []}
+        data = {"name": node.name, "type": "file", "size": node.size, "language": node_language(node),
+                "selected": id(node) in selected, "excluded": node.is_excluded}
+        if size_limit is not None and id(node) in selected and size_limit.exceeds(node):
+            data["size_limit"] = size_limit.label()
+        return data
+    
+    # Costruzione iterativa per non superare il limite di ricorsione su alberi profondi
+    result = entry(root_node) if root_node is not None else None
+    stack = [(root_node, result)] if root_node is not None and root_node.is_dir else []
+    while stack:
+        node, data = stack.pop()
+        for child in node.children:
+            child_data = entry(child)
+            data["children"].append(child_data)
+            if child.is_dir:
+                stack.append((child, child_data))
+    json.dump({"structure": result}, f, indent=1, ensure_ascii=False)
+    f.write("\n")
+
+# Formati dell'esportazione della struttura: classico, ad albero e JSON
+STRUCTURE_FORMATS = {
+    "classic": write_structure,
+    "tree": write_structure_tree,
+    "json": write_structure_json
+}
+
+# BOM riconosciuti (i BOM UTF-32 vanno controllati prima di quelli UTF-16)
+_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+]
+# Codifiche provate in ordine quando il contenuto non è UTF-8 valido (latin-1 non fallisce mai)
+FALLBACK_ENCODINGS = ['cp1252', 'latin-1']
+
+def to_utf8(data):
+    # Restituisce (contenuto in UTF-8, codifica rilevata). L'UTF-8 valido
+    # passa invariato; il resto viene transcodificato solo se necessario
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            data = data[len(bom):]
+            if encoding != 'utf-8':
+                return data.decode(encoding, errors='replace').encode('utf-8'), encoding
+            break
+    
+    # UTF-16 senza BOM: molti byte nulli, tutti in posizioni pari o dispari.
+    # Va controllato prima del percorso ASCII, perché anche il byte nullo è ASCII
+    head = data[:4096]
+    if head.count(b"\x00") > len(head) // 4:
+        encoding = 'utf-16-le' if head[1::2].count(b"\x00") > head[0::2].count(b"\x00") else 'utf-16-be'
+        return data.decode(encoding, errors='replace').encode('utf-8'), encoding
+    
+    # Percorso veloce per i file ASCII (la maggior parte del codice sorgente)
+    if getattr(data, "isascii", None) and data.isascii():
+        return data, 'ascii'
+    
+    try:
+        data.decode('utf-8')
+        return data, 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            return data.decode(encoding).encode('utf-8'), encoding
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace').encode('utf-8'), 'utf-8'
+
+def normalize_newlines(data):
+    # CRLF e CR isolati diventano LF (due passaggi in C solo se c'è un CR)
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    return data
+
+def read_source(path, newlines=True):
+    # Legge un file come byte UTF-8 pronti per l'esportazione
+    with open(path, 'rb') as source:
+        raw = source.read()
+    data, encoding = to_utf8(raw)
+    if newlines:
+        data = normalize_newlines(data)
+    return raw, data, encoding
+
+# Sintassi dei commenti per linguaggio: (commento di riga, commenti a blocco, stringhe).
+# I commenti "#" dei linguaggi di configurazione devono essere preceduti da uno spazio.
+# I commenti di riga si fermano prima di un eventuale \r, così le righe CRLF restano CRLF
+_HASH = r'#[^\r\n]*'
+_HASH_SPACED = r'(?:(?<=[ \t])|^)#[^\r\n]*'
+_SLASH = r'//[^\r\n]*'
+_C_BLOCK = r'/\*.*?\*/'
+_HTML_BLOCK = r'<!--.*?-->'
+_DQ = r'"(?:\\.|[^"\\\n])*"'
+_SQ = r"'(?:\\.|[^'\\\n])*'"
+_BQ = r'`(?:\\.|[^`\\])*`'
+_TRIPLE = r'"""(?:\\.|.)*?"""|' + r"'''(?:\\.|.)*?'''"
+# Regex letterali JavaScript: una "/" all'inizio di un'espressione (dopo un operatore,
+# una parentesi aperta, return o typeof) apre una regex e non una divisione
+_REGEX = r'(?:^|[(,=:\[!&|?{};+\-*%~^]|\breturn|\btypeof)[ \t]*/(?![/*])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[A-Za-z]*'
+
+LANGUAGE_SYNTAX = {
+    extension: syntax
+    for extensions, syntax in (
+        (('.py', '.pyw'), (_HASH, None, [_TRIPLE, _DQ, _SQ])),
+        (('.rb', '.pl', '.r'), (_HASH, None, [_DQ, _SQ])),
+        (('.sh', '.bash', '.zsh', '.yml', '.yaml', '.toml', '.ini', '.cfg', '.conf'), (_HASH_SPACED, None, [_DQ, _SQ])),
+        (('.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs', '.vue', '.svelte'), (_SLASH, _C_BLOCK, [_DQ, _SQ, _BQ, _REGEX])),
+        (('.c', '.h', '.cpp', '.hpp', '.cc', '.cs', '.java', '.kt', '.scala', '.swift', '.go', '.rs', '.php', '.dart'), (_SLASH, _C_BLOCK, [_DQ, _SQ, _BQ])),
+        (('.css', '.scss', '.less'), (None, _C_BLOCK, [_DQ, _SQ])),
+        (('.sql',), (r'--[^\r\n]*', _C_BLOCK, [_DQ, _SQ])),
+        (('.html', '.htm', '.xml', '.svg', '.md'), (None, _HTML_BLOCK, [])),
+    )
+    for extension in extensions
+}
+
+# Linguaggi in cui gli spazi a fine riga hanno un significato (a capo forzato in Markdown)
+SIGNIFICANT_TRAILING_SPACE = {'.md'}
+
+LICENSE_KEYWORDS = re.compile(rb'copyright|license|licence|spdx-license-identifier|all rights reserved', re.IGNORECASE)
+
+class SourceTransform:
+    # Trasformazioni applicate al contenuto durante l'esportazione. Ogni linguaggio
+    # usa un'unica regex: le stringhe vengono riconosciute e lasciate intatte,
+    # i commenti e gli spazi superflui fuori dalle stringhe vengono rimossi
+    def __init__(self, strip_comments=True, collapse_whitespace=True, drop_license=True):
+        self.strip_comments = strip_comments
+        self.collapse_whitespace = collapse_whitespace
+        self.drop_license = drop_license
+        self._patterns = {}
+
+    def __getstate__(self):
+        # Le regex compilate vengono ricreate nei processi del pool
+        state = dict(self.__dict__)
+        state["_patterns"] = {}
+        return state
+
+    def to_dict(self):
+        return {
+            "strip_comments": self.strip_comments,
+            "collapse_whitespace": self.collapse_whitespace,
+            "drop_license": self.drop_license
+        }
+
+    def _pattern(self, extension):
+        if extension not in self._patterns:
+            syntax = LANGUAGE_SYNTAX.get(extension)
+            pattern = None
+            if syntax:
+                line, block, strings = syntax
+                comments = [comment for comment in (line, block) if comment]
+                parts = ['(?P<s>' + '|'.join(strings) + ')'] if strings else []
+                if self.strip_comments and comments:
+                    # Le righe composte solo da un commento spariscono insieme al loro a capo
+                    parts.append(r'(?P<l>^[ \t]*(?:' + '|'.join(comments) + r')[ \t]*\r?\n)')
+                    parts.append(r'(?P<c>[ \t]*(?:' + '|'.join(comments) + '))')
+                if self.collapse_whitespace:
+                    whitespace = r'\r?\n(?:[ \t]*\r?\n){2,}'
+                    if extension not in SIGNIFICANT_TRAILING_SPACE:
+                        whitespace = r'[ \t]+(?=\r?$)|' + whitespace
+                    parts.append('(?P<w>' + whitespace + ')')
+                if len(parts) > (1 if strings else 0):
+                    pattern = re.compile('|'.join(parts).encode('ascii'), re.MULTILINE | re.DOTALL)
+            self._patterns[extension] = pattern
+        return self._patterns[extension]
+
+    def _license_pattern(self, extension):
+        # Primo blocco di commenti del file (dopo un eventuale shebang)
+        key = ("license", extension)
+        if key not in self._patterns:
+            syntax = LANGUAGE_SYNTAX.get(extension)
+            pattern = None
+            if syntax:
+                line, block, strings = syntax
+                comments = []
+                if line:
+                    comments.append(r'(?:[ \t]*' + line + r'(?:\r?\n|\Z))+')
+                if block:
+                    comments.append(r'[ \t]*' + block + r'[ \t]*(?:\r?\n|\Z)')
+                if comments:
+                    pattern = re.compile((r'\A(#![^\n]*\n)?\s*(' + '|'.join(comments) + ')').encode('ascii'), re.MULTILINE | re.DOTALL)
+            self._patterns[key] = pattern
+        return self._patterns[key]
+
+    def apply(self, data, extension):
+        # Restituisce i byte trasformati; i linguaggi sconosciuti passano invariati
+        extension = extension.lower()
+        if self.drop_license and not self.strip_comments:
+            pattern = self._license_pattern(extension)
+            match = pattern.match(data) if pattern else None
+            if match and LICENSE_KEYWORDS.search(match.group(2)):
+                data = (match.group(1) or b"") + data[match.end():]
+        
+        pattern = self._pattern(extension)
+        if pattern is None:
+            return data
+        
+        def replace(match):
+            kind = match.lastgroup
+            if kind == "s":
+                return match.group()
+            if kind in ("l", "c"):
+                # Lo shebang all'inizio del file non è un commento
+                if match.start() == 0 and match.group().startswith(b"#!"):
+                    return match.group()
+                return b""
+            if match.group().startswith(b"\r\n"):
+                return b"\r\n\r\n"
+            if match.group().startswith(b"\n"):
+                return b"\n\n"
+            return b""
+        
+        return pattern.sub(replace, data)
+
+def prepare_source(path, newlines=True, transform=None, size_limit=None, size=0):
+    # Lettura e trasformazione di un file (eseguibile anche in un processo del pool).
+    # Restituisce (byte letti, dati esportati, codifica, byte risparmiati)
+    if size_limit is not None and size > size_limit.max_bytes:
+        read_size, data, encoding = size_limit.read(path, size, newlines)
+    else:
+        raw, data, encoding = read_source(path, newlines)
+        read_size = len(raw)
+    saved = 0
+    if transform is not None:
+        transformed = transform.apply(data, os.path.splitext(str(path))[1])
+        saved = len(data) - len(transformed)
+        data = transformed
+    return read_size, data, encoding, saved
+
+# Sotto questa soglia avviare un pool di processi costa più della trasformazione
+PARALLEL_TRANSFORM_MIN_BYTES = 4 * 1024 * 1024
+
+def iter_prepared_sources(nodes, newlines=True, transform=None, max_workers=None, size_limit=None):
+    # Genera, nell'ordine dei nodi, il Future del contenuto di ogni file.
+    # Con una trasformazione e molti dati il lavoro va a un pool di processi,
+    # con al massimo qualche file in anticipo per worker per limitare la memoria
+    from concurrent.futures import Future
+    max_workers = max_workers or os.cpu_count() or 1
+    if transform is None or max_workers == 1 or sum(node.size for node in nodes) < PARALLEL_TRANSFORM_MIN_BYTES:
+        for node in nodes:
+            future = Future()
+            try:
+                future.set_result(prepare_source(node.path, newlines, transform, size_limit, node.size))
+            except Exception as e:
+                future.set_exception(e)
+            yield future
+        return
+    
+    from concurrent.futures import ProcessPoolExecutor
+    from collections import deque
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        window = deque()
+        for node in nodes:
+            window.append(executor.submit(prepare_source, node.path, newlines, transform, size_limit, node.size))
+            if len(window) >= max_workers * 4:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+
+def _trim_partial_utf8(data):
+    # Rimuove un carattere UTF-8 spezzato alla fine dei dati
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte < 0x80:
+            return data
+        if byte >= 0xC0:
+            length = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return data if back >= length else data[:-back]
+    return data
+
+class SizeLimit:
+    # Limite per file deciso con la dimensione rilevata dalla scansione:
+    # i file più grandi vengono saltati, troncati o campionati (inizio e fine)
+    MODES = ("skip", "truncate", "sample")
+    LABELS = {"skip": "skipped", "truncate": "truncated", "sample": "sampled"}
+
+    def __init__(self, max_bytes, mode="sample"):
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid size limit mode: {mode!r} (use {', '.join(self.MODES)})")
+        self.max_bytes = max_bytes
+        self.mode = mode
+
+    @classmethod
+    def parse(cls, text):
+        # "1MB", "1 MB", "1MB truncate", "500 KB skip": la modalità è l'ultima parola,
+        # se è tra quelle note; il resto è una dimensione come quelle di parse_budget
+        parts = (text or "").split()
+        mode = "sample"
+        if len(parts) > 1 and parts[-1].lower() in cls.MODES:
+            mode = parts.pop().lower()
+        try:
+            max_bytes, unit = parse_budget(" ".join(parts))
+        except ValueError:
+            raise ValueError(f"Invalid size limit: {text!r} (e.g. 1MB, 500 KB truncate; modes: {', '.join(cls.MODES)})")
+        if unit != "bytes":
+            raise ValueError(f"Size limit must be in bytes: {text!r}")
+        return cls(max_bytes, mode)
+
+    def __str__(self):
+        return f"{self.max_bytes} bytes ({self.mode})"
+
+    def to_text(self):
+        # Forma accettata da parse, per riproporre il limite corrente
+        for suffix, factor in (("MB", 1024 ** 2), ("KB", 1024)):
+            if self.max_bytes >= factor and self.max_bytes % factor == 0:
+                return f"{self.max_bytes // factor}{suffix} {self.mode}"
+        return f"{self.max_bytes}B {self.mode}"
+
+    def to_dict(self):
+        return {"max_bytes": self.max_bytes, "mode": self.mode}
+
+    def label(self):
+        return self.LABELS[self.mode]
+
+    def exceeds(self, node):
+        return not node.is_dir and node.size > self.max_bytes
+
+    def read(self, path, size, newlines=True):
+        # Come read_source, ma legge solo le parti del file che rientrano nel limite.
+        # Restituisce (byte letti, dati esportati, codifica)
+        if self.mode == "skip":
+            note = f"⏭️ FILE SKIPPED: {size} bytes exceed the {self.max_bytes} bytes limit\n"
+            return 0, note.encode('utf-8'), 'utf-8'
+        
+        head_size = self.max_bytes if self.mode == "truncate" else self.max_bytes // 2
+        tail = b""
+        with open(path, 'rb') as source:
+            head = source.read(head_size)
+            if self.mode == "sample":
+                source.seek(max(head_size, size - (self.max_bytes - head_size)))
+                tail = source.read()
+        
+        # I tagli cadono su un ritorno a capo (o almeno su un confine di carattere)
+        newline = head.rfind(b"\n")
+        head = head[:newline + 1] if newline >= 0 else _trim_partial_utf8(head)
+        if tail:
+            newline = tail.find(b"\n")
+            tail = tail[newline + 1:] if newline >= 0 else tail.lstrip(bytes(range(0x80, 0xC0)))
+        omitted = max(0, size - len(head) - len(tail))
+        
+        data, encoding = to_utf8(head)
+        if self.mode == "truncate":
+            data += f"\n✂️ [TRUNCATED: {omitted} more bytes]\n".encode('utf-8')
+        else:
+            data += f"\n✂️ [SAMPLED: {omitted} bytes omitted]\n\n".encode('utf-8') + to_utf8(tail)[0]
+        if newlines:
+            data = normalize_newlines(data)
+        return len(head) + len(tail), data, encoding
+
+def write_contents(f, nodes, project_root, diffs=None, diff_ref=None, perf=None, newlines=True, transform=None, max_workers=None,
+                   size_limit=None):
+    # Scrive in un file binario intestazione e contenuto di ogni file (ed
+    # eventualmente il suo diff git); newlines=True normalizza i fine riga,
+    # transform (SourceTransform) rimuove commenti e spazi superflui,
+    # size_limit (SizeLimit) limita i file più grandi senza leggerli per intero
+    project_root = as_project_root(project_root)
+    sources = iter_prepared_sources(nodes, newlines, transform, max_workers, size_limit)
+    for node, source in zip(nodes, sources):
+        try:
+            relative = relative_export_path(node.path, project_root)
+            f.write(format_file_header(relative).encode('utf-8'))
+            
+            raw_size, data, encoding, saved = source.result()
+            f.write(data)
+            if perf:
+                perf.count("export.bytes_read", raw_size)
+                if saved:
+                    perf.count("export.bytes_saved", saved)
+                if size_limit is not None and size_limit.exceeds(node):
+                    perf.count("export.capped_files")
+                if encoding not in ('ascii', 'utf-8'):
+                    perf.count("export.transcoded_files")
+            
+            # Diff rispetto al ref git di base, se richiesto
+            f.write(format_diff_block(diffs, relative, diff_ref))
+        except Exception as e:
+            f.write(f"\n\n❌ ERROR READING FILE: {str(e)}\n".encode('utf-8'))
+
+def format_diff_block(diffs, relative_path, diff_ref):
+    # Diff git di un file da accodare al suo contenuto (b"" se non c'è)
+    diff = diffs.get(relative_path.as_posix()) if diffs else None
+    if not diff:
+        return b""
+    return f"\n\n{'-'*50}\n🔀 DIFF vs {diff_ref}\n{'-'*50}\n\n{diff}".encode('utf-8')
+
+def format_file_header(relative_path, part=None, parts=None):
+    # Intestazione scritta prima del contenuto di ogni file esportato
+    label = f"{relative_path} (part {part}/{parts})" if parts and parts > 1 else f"{relative_path}"
+    return f"\n\n{'='*50}\n📄 FILE: {label}\n{'='*50}\n\n"
+
+def _split_boundaries(data, piece_size):
+    # Calcola i punti di taglio di un contenuto troppo grande, anticipandoli
+    # all'ultimo ritorno a capo (o almeno a un confine di carattere UTF-8)
+    boundaries = [0]
+    while len(data) - boundaries[-1] > piece_size:
+        start = boundaries[-1]
+        cut = start + piece_size
+        newline = data.rfind(b"\n", max(start + 1, cut - min(64 * 1024, piece_size // 2)), cut)
+        if newline >= 0:
+            cut = newline + 1
+        else:
+            while cut - 1 > start and 0x80 <= data[cut] < 0xC0:
+                cut -= 1
+        boundaries.append(cut)
+    boundaries.append(len(data))
+    return boundaries
+
+def header_cost(relative, unit="bytes"):
+    cost = len(format_file_header(relative).encode('utf-8'))
+    return (cost + 3) // 4 if unit == "tokens" else cost
+
+def min_part_limit(relative, unit="bytes"):
+    # Ogni parte ripete l'intestazione (con "parte N/M"): il limite deve lasciare
+    # per il contenuto almeno altrettanto spazio, altrimenti le parti sarebbero quasi solo intestazioni
+    return 2 * header_cost(relative, unit) + 16
+
+def plan_shards(prepared, limit, unit="bytes"):
+    # Suddivide i contenuti già preparati in parti di al massimo `limit` byte o token
+    # mantenendo l'ordine; un file viene diviso solo se da solo supera il limite.
+    # prepared: (node, percorso relativo, dati, token). Genera ogni parte come lista
+    # di pezzi (node, percorso relativo, inizio, fine, dati, parte, totale parti)
+    current = []
+    used = 0
+    for node, relative, data, tokens in prepared:
+        header = header_cost(relative, unit)
+        cost = header + (tokens if unit == "tokens" else len(data))
+        
+        if cost <= limit:
+            if used + cost > limit and current:
+                yield current
+                current, used = [], 0
+            current.append((node, relative, 0, len(data), data, 1, 1))
+            used += cost
+            continue
+        
+        # File più grande del limite: va diviso in più parti
+        if current:
+            yield current
+            current, used = [], 0
+        if limit < min_part_limit(relative, unit):
+            raise ValueError(f"Part limit of {limit} {unit} is too small for {relative.as_posix()}: "
+                             f"each part needs at least {min_part_limit(relative, unit)} {unit}")
+        budget = limit - header - 16
+        if unit == "tokens":
+            budget = max(1, int(budget * len(data) / max(tokens, 1)))
+        boundaries = _split_boundaries(data, budget)
+        parts = len(boundaries) - 1
+        for index in range(parts):
+            start, end = boundaries[index], boundaries[index + 1]
+            yield [(node, relative, start, end, data[start:end], index + 1, parts)]
+    if current:
+        yield current
+
+def shard_path(output_path, index, count):
+    base, extension = os.path.splitext(output_path)
+    width = max(3, len(str(count)))
+    return f"{base}.part{index:0{width}d}{extension}"
+
+def remove_stale_shards(output_path, keep):
+    # Elimina le parti di un'esportazione precedente che non fanno parte della nuova
+    base, extension = os.path.splitext(output_path)
+    pattern = re.compile(re.escape(os.path.basename(base)) + r"\.part[0-9]{3,}" + re.escape(extension) + r"\Z")
+    folder = os.path.dirname(os.path.abspath(output_path))
+    keep = set(os.path.basename(path) for path in keep)
+    for name in os.listdir(folder):
+        if pattern.match(name) and name not in keep:
+            try:
+                os.remove(os.path.join(folder, name))
+            except OSError:
+                pass
+
+def write_shard(out, pieces):
+    # Scrive una parte e restituisce i byte scritti
+    written = 0
+    for node, relative, start, end, data, part, parts in pieces:
+        header = format_file_header(relative, part, parts).encode('utf-8')
+        out.write(header)
+        out.write(data)
+        written += len(header) + len(data)
+    return written
+
+def export_shards(nodes, project_root, output_path, limit, unit="bytes", max_workers=None,
+                  newlines=True, transform=None, size_limit=None, diffs=None, diff_ref=None):
+    # Esporta in più parti e salva un manifest JSON. Le parti vengono pianificate sul
+    # contenuto preparato come in write_contents (UTF-8, fine riga, trasformazione e
+    # limite di dimensione), preparato in parallelo da iter_prepared_sources;
+    # inizio e fine nel manifest sono offset nel contenuto esportato
+    project_root = as_project_root(project_root)
+    relatives = [relative_export_path(node.path, project_root) for node in nodes]
+    if relatives:
+        longest = max(relatives, key=lambda relative: len(format_file_header(relative).encode('utf-8')))
+        if limit < min_part_limit(longest, unit):
+            raise ValueError(f"Part limit of {limit} {unit} is too small: "
+                             f"each part needs at least {min_part_limit(longest, unit)} {unit}")
+    
+    def prepared():
+        sources = iter_prepared_sources(nodes, newlines, transform, max_workers, size_limit)
+        for node, relative, source in zip(nodes, relatives, sources):
+            try:
+                data = source.result()[1] + format_diff_block(diffs, relative, diff_ref)
+            except Exception as e:
+                data = f"\n\n❌ ERROR READING FILE: {str(e)}\n".encode('utf-8')
+            tokens = None
+            if unit == "tokens":
+                # La stima della scansione vale per il file originale: si riscala sul contenuto esportato
+                tokens = (node.tokens * len(data) // node.size if node.tokens is not None and node.size
+                          else estimate_tokens(data))
+            yield node, relative, data, tokens
+    
+    paths = []
+    manifest_parts = []
+    for pieces in plan_shards(prepared(), limit, unit):
+        path = shard_path(output_path, len(paths) + 1, 0)
+        with open(path, 'wb') as out:
+            size = write_shard(out, pieces)
+        paths.append(path)
+        manifest_parts.append({
+            "file": None,
+            "bytes": size,
+            "files": [
+                {"path": relative.as_posix(), "start": start, "end": end, "part": part, "parts": parts}
+                for node, relative, start, end, data, part, parts in pieces
+            ]
+        })
+    
+    # Il numero di cifre dipende dal totale delle parti, noto solo alla fine
+    final_paths = [shard_path(output_path, index + 1, len(paths)) for index in range(len(paths))]
+    for path, final_path in zip(paths, final_paths):
+        if path != final_path:
+            os.replace(path, final_path)
+    remove_stale_shards(output_path, final_paths)
+    for path, part in zip(final_paths, manifest_parts):
+        part["file"] = os.path.basename(path)
+    
+    manifest = {
+        "project": str(project_root),
+        "limit": limit,
+        "unit": unit,
+        "newlines": newlines,
+        "transform": transform.to_dict() if transform is not None else None,
+        "size_limit": size_limit.to_dict() if size_limit is not None else None,
+        "parts": manifest_parts
+    }
+    manifest_path = os.path.splitext(output_path)[0] + ".manifest.json"
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return final_paths, manifest_path
+
+def copy_file_range_bytes(src_fd, dst_fd, offset, length):
+    # Copia `length` byte da src (a partire da offset) alla posizione corrente
+    # di dst, usando copy_file_range/sendfile dove disponibili
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < length:
+                n = os.copy_file_range(src_fd, dst_fd, length - copied, offset + copied)
+                if n == 0:
+                    break
+                copied += n
+            return copied
+        except OSError:
+            pass
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        try:
+            while copied < length:
+                n = os.sendfile(dst_fd, src_fd, offset + copied, length - copied)
+                if n == 0:
+                    break
+                copied += n
+            return copied
+        except OSError:
+            pass
+    while copied < length:
+        if hasattr(os, "pread"):
+            chunk = os.pread(src_fd, min(length - copied, 1024 * 1024), offset + copied)
+        else:
+            os.lseek(src_fd, offset + copied, os.SEEK_SET)
+            chunk = os.read(src_fd, min(length - copied, 1024 * 1024))
+        if not chunk:
+            break
+        os.write(dst_fd, chunk)
+        copied += len(chunk)
+    return copied
+
+def incremental_manifest_path(output_path):
+    return os.path.splitext(output_path)[0] + ".incremental.json"
+
+def _load_incremental_manifest(output_path):
+    # Il manifest è valido solo se l'output precedente non è stato modificato
+    try:
+        with open(incremental_manifest_path(output_path), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        stat = os.stat(output_path)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("output_size") != stat.st_size or manifest.get("output_mtime_ns") != stat.st_mtime_ns:
+        return None
+    return manifest
+
+def export_incremental(nodes, project_root, output_path, newlines=True, transform=None, size_limit=None,
+                       diffs=None, diff_ref=None):
+    # Esportazione incrementale: i file con stessa dimensione e mtime (e stesso
+    # diff git, se richiesto) dell'esportazione precedente vengono copiati in blocco
+    # dal vecchio output, gli altri vengono riletti. Restituisce le statistiche del run.
+    import hashlib
+    project_root = as_project_root(project_root)
+    transform_options = transform.to_dict() if transform is not None else None
+    limit_options = size_limit.to_dict() if size_limit is not None else None
+    previous = _load_incremental_manifest(output_path)
+    if previous and (previous.get("newlines", True) != newlines or previous.get("transform") != transform_options
+                     or previous.get("size_limit") != limit_options):
+        previous = None
+    previous_files = {entry["path"]: entry for entry in previous["files"]} if previous else {}
+    stats = {"files": len(nodes), "reused": 0, "read": 0, "bytes_copied": 0, "bytes_read": 0, "bytes_saved": 0}
+    entries = []
+    temp_path = output_path + ".tmp"
+    pending = []  # [inizio nel vecchio output, lunghezza] da copiare in blocco
+    
+    def flush_pending(old, out):
+        if pending:
+            copied = copy_file_range_bytes(old.fileno(), out.fileno(), pending[0], pending[1])
+            if copied != pending[1]:
+                raise OSError("Previous export is shorter than its manifest")
+            stats["bytes_copied"] += copied
+            del pending[:]
+    
+    old = open(output_path, 'rb') if previous else None
+    try:
+        with open(temp_path, 'wb', buffering=0) as out:
+            offset = 0
+            for node in nodes:
+                relative = relative_export_path(node.path, project_root)
+                try:
+                    stat = os.stat(node.path)
+                    size, mtime_ns = stat.st_size, stat.st_mtime_ns
+                except OSError:
+                    size, mtime_ns = None, None
+                
+                diff_block = format_diff_block(diffs, relative, diff_ref)
+                diff_hash = hashlib.sha1(diff_block).hexdigest() if diff_block else None
+                
+                entry = previous_files.get(relative.as_posix())
+                if (entry and size is not None and entry["size"] == size and entry["mtime_ns"] == mtime_ns and entry["hash"]
+                        and entry.get("diff_hash") == diff_hash):
+                    # Segmento invariato: accodalo alla copia in blocco
+                    if pending and pending[0] + pending[1] == entry["offset"]:
+                        pending[1] += entry["length"]
+                    else:
+                        flush_pending(old, out)
+                        pending.extend((entry["offset"], entry["length"]))
+                    entries.append(dict(entry, offset=offset))
+                    offset += entry["length"]
+                    stats["reused"] += 1
+                    continue
+                
+                flush_pending(old, out)
+                segment = format_file_header(relative).encode('utf-8')
+                digest = None
+                try:
+                    read_size, data, encoding, saved = prepare_source(node.path, newlines, transform, size_limit, size or 0)
+                    digest = hashlib.sha1(data).hexdigest()
+                    stats["bytes_read"] += read_size
+                    stats["bytes_saved"] += saved
+                    segment += data + diff_block
+                except Exception as e:
+                    segment += f"\n\n❌ ERROR READING FILE: {str(e)}\n".encode('utf-8')
+                out.write(segment)
+                entries.append({
+                    "path": relative.as_posix(),
+                    "size": size,
+                    "mtime_ns": mtime_ns,
+                    "hash": digest,
+                    "diff_hash": diff_hash if digest else None,
+                    "offset": offset,
+                    "length": len(segment)
+                })
+                offset += len(segment)
+                stats["read"] += 1
+            flush_pending(old, out)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    finally:
+        if old:
+            old.close()
+    
+    os.replace(temp_path, output_path)
+    stat = os.stat(output_path)
+    with open(incremental_manifest_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump({
+            "project": str(project_root),
+            "output_size": stat.st_size,
+            "output_mtime_ns": stat.st_mtime_ns,
+            "newlines": newlines,
+            "transform": transform_options,
+            "size_limit": limit_options,
+            "files": entries
+        }, f, indent=1, ensure_ascii=False)
+    return stats
+
+class GitError(Exception):
+    pass
+
+def run_git(project_path, *args):
+    # Esegue il binario git nella cartella del progetto e restituisce stdout (bytes)
+    import subprocess
+    git = shutil.which("git")
+    if git is None:
+        raise GitError("git executable not found in PATH")
+    result = subprocess.run(
+        [git, "-C", str(project_path)] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=120
+    )
+    if result.returncode != 0:
+        raise GitError(result.stderr.decode("utf-8", errors="replace").strip() or f"git {args[0]} failed")
+    return result.stdout
+
+def git_merge_base(project_path, base_ref):
+    # Punto di biforcazione tra il ref di base e HEAD (il ref stesso se non esiste)
+    try:
+        return run_git(project_path, "merge-base", base_ref, "HEAD").decode().strip()
+    except GitError:
+        return run_git(project_path, "rev-parse", "--verify", base_ref + "^{commit}").decode().strip()
+
+def git_changed_files(project_path, base_ref):
+    # File modificati rispetto al ref (commit, staged, working tree e non tracciati),
+    # relativi alla cartella del progetto; i file cancellati vengono ignorati
+    base = git_merge_base(project_path, base_ref)
+    changed = run_git(project_path, "diff", "--relative", "--name-only", "--no-renames", "--diff-filter=d", "-z", base)
+    untracked = run_git(project_path, "ls-files", "--others", "--exclude-standard", "-z")
+    paths = set()
+    for output in (changed, untracked):
+        paths.update(path for path in output.decode("utf-8", errors="surrogateescape").split("\0") if path)
+    return sorted(paths), base
+
+def git_unquote(path):
+    # Percorso come lo stampa git: tra virgolette e con escape in stile C se contiene
+    # caratteri speciali (i byte non ASCII restano tali con core.quotePath=false)
+    if len(path) >= 2 and path.startswith('"') and path.endswith('"'):
+        raw = path[1:-1].encode("utf-8", errors="surrogateescape")
+        return codecs.escape_decode(raw)[0].decode("utf-8", errors="replace")
+    return path
+
+def git_diff_path(header):
+    # Percorso del file dalla riga "diff --git a/<percorso> b/<percorso>"; senza
+    # rinomine i due percorsi coincidono, quindi anche gli spazi sono ammessi
+    header = header[len("diff --git "):]
+    if header.startswith('"'):
+        match = re.match(r'"(?:\\.|[^"\\])*"', header)
+        return git_unquote(match.group())[2:] if match else None
+    return header[2:2 + (len(header) - 5) // 2] if header.startswith("a/") else None
+
+def git_file_diffs(project_path, base):
+    # Diff unificati per file rispetto al commit di base
+    output = run_git(project_path, "-c", "core.quotePath=false", "diff", "--relative", "--no-renames", "--no-color", base)
+    diffs = {}
+    for chunk in re.split(r"(?m)^(?=diff --git )", output.decode("utf-8", errors="replace")):
+        if not chunk.startswith("diff --git "):
+            continue
+        path = git_diff_path(chunk.split("\n", 1)[0])
+        if path:
+            diffs[path] = chunk
+    return diffs
+
+def build_tree_from_paths(root_path, relative_paths, is_excluded, show_excluded=False):
+    # Costruisce un albero minimo di Node contenente solo i percorsi indicati;
+    # is_excluded(path, is_dir) applica le regole di esclusione
+    root_node = Node(root_path.name, root_path, False, True)
+    folders = {(): root_node}
+    excluded_count = 0
+    selected_count = 0
+    total_size = 0
+    
+    for relative in relative_paths:
+        parts = tuple(Path(relative).parts)
+        path = root_path.joinpath(*parts)
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        if not os.path.isfile(path):
+            continue
+        
+        # Un file dentro una cartella esclusa è escluso a sua volta
+        excluded = any(is_excluded(root_path.joinpath(*parts[:index + 1]), True) for index in range(len(parts) - 1))
+        excluded = excluded or is_excluded(path, False)
+        if excluded and not show_excluded:
+            continue
+        
+        parent = root_node
+        for index in range(len(parts) - 1):
+            key = parts[:index + 1]
+            folder = folders.get(key)
+            if folder is None:
+                folder = Node(parts[index], root_path.joinpath(*key), False, True)
+                folders[key] = folder
+                parent.children.append(folder)
+            parent = folder
+        parent.children.append(Node(path.name, path, excluded, False, stat.st_size, stat.st_mtime))
+        
+        if excluded:
+            excluded_count += 1
+        else:
+            selected_count += 1
+            total_size += stat.st_size
+    
+    return root_node, excluded_count, selected_count, total_size
+
+# Strumentazione: tempi per fase, contatori e blocchi del thread principale
+class PerfRecorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Informazioni che sopravvivono a reset() (ad esempio i tempi di avvio)
+        self.info = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.origin = time.perf_counter()
+            self.events = []  # (nome, inizio, durata, thread, argomenti)
+            self.counters = {}
+
+    @contextmanager
+    def phase(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_event(name, start, time.perf_counter() - start, args)
+
+    def add_event(self, name, start, duration, args=None):
+        with self.lock:
+            self.events.append((name, start, duration, threading.get_ident(), args or {}))
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_stall(self, start, duration):
+        self.add_event("tk.stall", start, duration)
+        self.count("tk.stalls")
+
+    def summary(self):
+        with self.lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+        phases = {}
+        for name, start, duration, thread_id, args in events:
+            phase = phases.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            phase["count"] += 1
+            phase["total_s"] += duration
+            phase["max_s"] = max(phase["max_s"], duration)
+        
+        rates = {}
+        scan_time = phases.get("scan.build_tree", {}).get("total_s")
+        if scan_time:
+            rates["scan.entries_per_s"] = counters.get("scan.entries", 0) / scan_time
+        export_time = sum(phase["total_s"] for name, phase in phases.items() if name.startswith("export."))
+        if export_time:
+            rates["export.bytes_written_per_s"] = counters.get("export.bytes_written", 0) / export_time
+        return {"info": dict(self.info), "phases": phases, "counters": counters, "rates": rates}
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = []
+        for section, values in sorted(summary["info"].items()):
+            lines.append(section.upper())
+            for name, value in values.items():
+                if isinstance(value, float):
+                    lines.append(f"  {name:<24} {value * 1000:>10.1f} ms")
+                else:
+                    lines.append(f"  {name:<24} {value:>10}")
+            lines.append("")
+        lines.append("PHASES")
+        for name, phase in sorted(summary["phases"].items()):
+            lines.append(f"  {name:<24} {phase['total_s'] * 1000:>10.1f} ms  x{phase['count']}  (max {phase['max_s'] * 1000:.1f} ms)")
+        lines.append("")
+        lines.append("COUNTERS")
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(f"  {name:<24} {value:>10}")
+        lines.append("")
+        lines.append("RATES")
+        for name, value in sorted(summary["rates"].items()):
+            lines.append(f"  {name:<24} {value:>10.0f}")
+        return "\n".join(lines)
+
+    def dump_json(self, output_path):
+        with self.lock:
+            events = [
+                {"name": name, "start_s": start - self.origin, "duration_s": duration, "thread": thread_id, "args": args}
+                for name, start, duration, thread_id, args in self.events
+            ]
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({"summary": self.summary(), "events": events}, f, indent=2)
+
+    def dump_chrome_trace(self, output_path):
+        # Formato "Trace Event" leggibile da chrome://tracing e Perfetto
+        pid = os.getpid()
+        with self.lock:
+            trace_events = [
+                {"name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": thread_id,
+                 "ts": (start - self.origin) * 1e6, "dur": duration * 1e6, "args": args}
+                for name, start, duration, thread_id, args in self.events
+            ]
+            end = max([event["ts"] + event["dur"] for event in trace_events] or [0])
+            trace_events.extend(
+                {"name": name, "ph": "C", "pid": pid, "ts": end, "args": {"value": value}}
+                for name, value in self.counters.items()
+            )
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+# Regole di esclusione predefinite
+DEFAULT_EXCLUDE_FOLDERS = ['node_modules', '.git', '.next', '.venv', 'venv', '__pycache__', '.idea', '.vscode']
+DEFAULT_EXCLUDE_FILES = ['package-lock.json', 'yarn.lock', '.DS_Store']
+DEFAULT_EXCLUDE_EXTENSIONS = [
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp', '.ico', '.tiff', '.psd',
+    '.mp3', '.wav', '.ogg', '.flac', '.aac', '.m4a', '.wma', '.opus',
+    '.mp4', '.mov', '.avi', '.mkv', '.flv', '.webm', '.wmv', '.m4v', '.3gp',
+    '.pdf', '.zip', '.tar', '.gz', '.7z', '.rar', '.exe', '.dll', '.so', '.dylib'
+]
+DEFAULT_INCLUDE_EXTENSIONS = ['.py', '.js', '.ts', '.tsx', '.jsx', '.html', '.css', '.json', '.env', '.md', '.txt', '.yml', '.yaml', '.xml', '.csv', '.ini', '.cfg', '.conf']
+
+# Regole di esclusione usate da una scansione
+class ScanRules:
+    def __init__(self, exclude_folders=None, exclude_files=None, exclude_extensions=None,
+                 include_extensions=None, show_excluded=False, follow_symlinks=True):
+        self.exclude_folders = list(DEFAULT_EXCLUDE_FOLDERS if exclude_folders is None else exclude_folders)
+        self.exclude_files = list(DEFAULT_EXCLUDE_FILES if exclude_files is None else exclude_files)
+        self.exclude_extensions = list(DEFAULT_EXCLUDE_EXTENSIONS if exclude_extensions is None else exclude_extensions)
+        self.include_extensions = list(DEFAULT_INCLUDE_EXTENSIONS if include_extensions is None else include_extensions)
+        self.show_excluded = show_excluded
+        self.follow_symlinks = follow_symlinks
+
+    @classmethod
+    def from_dict(cls, data, base=None):
+        # Regole da un dizionario (file JSON); le chiavi assenti vengono prese da base
+        base = base or cls()
+        rules = cls(base.exclude_folders, base.exclude_files, base.exclude_extensions,
+                    base.include_extensions, base.show_excluded, base.follow_symlinks)
+        for key in ("exclude_folders", "exclude_files", "exclude_extensions", "include_extensions"):
+            if isinstance(data.get(key), list):
+                setattr(rules, key, list(data[key]))
+        for key in ("show_excluded", "follow_symlinks"):
+            if key in data:
+                setattr(rules, key, bool(data[key]))
+        return rules
+
+    def is_excluded(self, path, is_dir):
+        # Applica le regole di esclusione a un singolo percorso
+        if is_dir:
+            return path.name in self.exclude_folders
+        return (path.name in self.exclude_files
+                or path.suffix.lower() in self.exclude_extensions
+                or path.suffix not in self.include_extensions)
+
+def inode_key(stat_result, path=None):
+    # Identità di un file o di una cartella: (st_dev, st_ino). Lo stat di scandir
+    # su Windows non ha st_ino, in quel caso serve uno stat completo del percorso
+    if not stat_result.st_ino and path is not None:
+        stat_result = os.stat(path)
+    return (stat_result.st_dev, stat_result.st_ino) if stat_result.st_ino else None
+
+# Scansione del file system indipendente dall'interfaccia
+class ProjectScanner:
+    def __init__(self, rules=None, perf=None, on_progress=None, is_active=None):
+        self.rules = rules or ScanRules()
+        self.perf = perf or PerfRecorder()
+        # on_progress(numero di elementi) viene chiamato ogni 10 elementi
+        self.on_progress = on_progress
+        self.is_active = is_active or (lambda: True)
+        self._reset_links()
+
+    def _reset_links(self):
+        # Cartelle e file già visitati (per inode) e cosa è stato scartato nell'ultima visita
+        self.visited_dirs = set()
+        self.seen_files = set()
+        self._ancestors = set()
+        self._deferred = []
+        self.link_stats = {"symlinks_skipped": 0, "cycles": 0, "duplicates": 0}
+
+    def _start_visit(self, current_path):
+        self._reset_links()
+        try:
+            key = inode_key(os.stat(current_path), current_path)
+        except OSError:
+            key = None
+        if key is not None:
+            self.visited_dirs.add(key)
+            self._ancestors.add(key)
+
+    def _enter_dir(self, entry):
+        # Restituisce l'inode della cartella se va visitata, False per un ciclo o un duplicato
+        try:
+            key = inode_key(entry.stat(), entry.path)
+        except OSError:
+            return None
+        if key is None:
+            return None
+        if key in self._ancestors:
+            # Link simbolico verso una cartella antenata: ciclo
+            self.link_stats["cycles"] += 1
+            return False
+        if key in self.visited_dirs:
+            # Stessa cartella già raggiunta da un altro percorso
+            self.link_stats["duplicates"] += 1
+            return False
+        self.visited_dirs.add(key)
+        self._ancestors.add(key)
+        return key
+
+    def _list_dir(self, current_path):
+        # Voci della cartella come (DirEntry, is_dir, is_symlink); con scandir
+        # i tipi arrivano dal sistema operativo senza uno stat per voce
+        with os.scandir(current_path) as entries:
+            items = list(entries)
+        listed = []
+        for entry in items:
+            try:
+                is_symlink = entry.is_symlink()
+                is_dir = entry.is_dir()
+            except OSError:
+                is_symlink, is_dir = False, False
+            if is_symlink and not self.rules.follow_symlinks:
+                self.link_stats["symlinks_skipped"] += 1
+                continue
+            listed.append((entry, is_dir, is_symlink))
+        return listed
+
+    def _count_link_stats(self, prefix):
+        for name, value in self.link_stats.items():
+            if value:
+                self.perf.count(f"{prefix}.{name}", value)
+
+    @staticmethod
+    def _file_key(entry, stat, is_symlink):
+        # Identità di un file per riconoscere hardlink e link simbolici già visti
+        if stat.st_ino:
+            return (stat.st_dev, stat.st_ino)
+        if is_symlink or stat.st_nlink > 1:
+            return inode_key(stat, entry.path)
+        return None
+
+    def count_files(self, current_path):
+        # Stesse regole di build_tree, duplicati compresi, così il totale
+        # mostrato nel progresso coincide con i file della scansione
+        self._start_visit(current_path)
+        try:
+            dev = os.stat(current_path).st_dev
+        except OSError:
+            dev = 0
+        count = self._count_files(current_path, dev)
+        self._count_link_stats("count")
+        return count
+
+    def _count_files(self, current_path, dev):
+        count = 0
+        stat_calls = 0
+        try:
+            self.perf.count("count.dirs_listed")
+            for entry, is_dir, is_symlink in self._list_dir(current_path):
+                name = entry.name
+                
+                if is_dir and name in self.rules.exclude_folders:
+                    continue
+                
+                if not is_dir and name in self.rules.exclude_files:
+                    continue
+                
+                suffix = os.path.splitext(name)[1]
+                if not is_dir and suffix.lower() in self.rules.exclude_extensions:
+                    continue
+                
+                if not is_dir and suffix not in self.rules.include_extensions:
+                    continue
+                
+                if is_dir:
+                    stat_calls += 1
+                    key = self._enter_dir(entry)
+                    if key is False:
+                        continue
+                    count += self._count_files(entry.path, key[0] if key else dev)
+                    self._ancestors.discard(key)
+                    continue
+                
+                if is_symlink or os.name == "nt":
+                    stat_calls += 1
+                    try:
+                        key = self._file_key(entry, entry.stat(), is_symlink)
+                    except OSError:
+                        key = None
+                else:
+                    # Un file normale sta sul dispositivo della sua cartella e
+                    # su POSIX l'inode arriva da scandir senza uno stat
+                    key = (dev, entry.inode())
+                if key is not None:
+                    if key in self.seen_files:
+                        self.link_stats["duplicates"] += 1
+                        continue
+                    self.seen_files.add(key)
+                count += 1
+        except PermissionError:
+            pass
+        
+        self.perf.count("count.stat_calls", stat_calls)
+        return count
+
+    def build_tree(self, current_path):
+        # Visita dalla radice: cicli, link saltati e duplicati finiscono in link_stats.
+        # I link simbolici vengono visitati per ultimi, così i file e le cartelle
+        # reali hanno la precedenza sui loro alias
+        self._start_visit(current_path)
+        self._deferred = []
+        node, excluded_count, selected_count, total_size = self._build_tree(Path(current_path))
+        totals = [excluded_count, selected_count, total_size]
+        
+        index = 0
+        stat_calls = 0
+        while index < len(self._deferred) and self.is_active():
+            parent, entry, item, is_dir, is_excluded, ancestors = self._deferred[index]
+            index += 1
+            self._ancestors = set(ancestors)
+            stat_calls += self._add_entry(parent, entry, item, is_dir, True, is_excluded, totals)
+        self._deferred = []
+        
+        self.perf.count("scan.stat_calls", stat_calls)
+        self._count_link_stats("scan")
+        return node, totals[0], totals[1], totals[2]
+
+    def _add_entry(self, node, entry, item, is_dir, is_symlink, is_excluded, totals):
+        # Aggiunge a node il figlio corrispondente a entry e aggiorna totals
+        # (esclusi, selezionati, dimensione); restituisce il numero di stat eseguiti
+        if is_dir:
+            key = self._enter_dir(entry)
+            if key is False:
+                return 1
+            child_node, child_excluded, child_selected, child_size = self._build_tree(item)
+            self._ancestors.discard(key)
+            node.children.append(child_node)
+            totals[0] += child_excluded
+            totals[1] += child_selected
+            totals[2] += child_size
+            return 1
+        
+        key = None
+        try:
+            stat = entry.stat()
+            size, mtime = stat.st_size, stat.st_mtime
+            key = self._file_key(entry, stat, is_symlink)
+        except OSError:
+            size, mtime = 0, 0
+        
+        # Hardlink o link simbolico verso un file già incluso: non va esportato due volte
+        if key is not None and not is_excluded:
+            if key in self.seen_files:
+                self.link_stats["duplicates"] += 1
+                return 1
+            self.seen_files.add(key)
+        
+        node.children.append(Node(item.name, item, is_excluded, False, size, mtime))
+        if is_excluded:
+            totals[0] += 1
+        else:
+            totals[1] += 1
+            totals[2] += size
+        return 1
+
+    def _build_tree(self, current_path):
+        node = Node(current_path.name, current_path, False, True)
+        totals = [0, 0, 0]  # esclusi, selezionati, dimensione
+        processed_count = 0
+        stat_calls = 0
+        
+        try:
+            items = self._list_dir(current_path)
+            self.perf.count("scan.dirs_listed")
+            for entry, is_dir, is_symlink in items:
+                if not self.is_active():
+                    break
+                    
+                processed_count += 1
+                
+                # Aggiorna periodicamente la coda per mostrare il progresso
+                if processed_count % 10 == 0 and self.on_progress:
+                    self.on_progress(processed_count)
+                
+                item = Path(entry.path)
+                is_excluded = False
+                
+                if is_dir and item.name in self.rules.exclude_folders:
+                    is_excluded = True
+                
+                if not is_dir and item.name in self.rules.exclude_files:
+                    is_excluded = True
+                
+                if not is_dir and item.suffix.lower() in self.rules.exclude_extensions:
+                    is_excluded = True
+                
+                if not is_dir and item.suffix not in self.rules.include_extensions:
+                    is_excluded = True
+                
+                if not is_excluded or self.rules.show_excluded:
+                    if is_symlink:
+                        self._deferred.append((node, entry, item, is_dir, is_excluded, frozenset(self._ancestors)))
+                    else:
+                        stat_calls += self._add_entry(node, entry, item, is_dir, False, is_excluded, totals)
+                    
+        except PermissionError:
+            pass
+        
+        self.perf.count("scan.entries", processed_count)
+        self.perf.count("scan.stat_calls", stat_calls)
+        return node, totals[0], totals[1], totals[2]
 
-# Installa customtkinter se non è installato
-try:
-    import customtkinter as ctk
-    CUSTOMTKINTER_AVAILABLE = True
-except ImportError:
-    CUSTOMTKINTER_AVAILABLE = False
-    print("customtkinter non è installato. Usa 'pip install customtkinter' per installarlo.")
-    print("Eseguendo con tkinter standard...")
+# File opzionale nella radice di un progetto con le sue regole di esclusione
+PROJECT_RULES_FILE = ".code-exporter.json"
+
+def read_project_settings(root_path):
+    # Contenuto di PROJECT_RULES_FILE ({} se manca o non è valido)
+    try:
+        with open(os.path.join(root_path, PROJECT_RULES_FILE), 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    except (OSError, ValueError):
+        settings = {}
+    return settings if isinstance(settings, dict) else {}
+
+def load_project_rules(root_path, base_rules):
+    # Regole di una radice: quelle di base aggiornate con PROJECT_RULES_FILE se presente
+    return ScanRules.from_dict(read_project_settings(root_path), base_rules)
+
+def load_selection_rules(root_paths, base_rules=None):
+    # Priorità dell'auto-selezione: la chiave "selection_rules" di PROJECT_RULES_FILE.
+    # In un workspace le radici si applicano in ordine; i valori non validi vengono ignorati
+    rules = base_rules or SelectionRules()
+    for root_path in root_paths:
+        try:
+            rules = SelectionRules.from_dict(read_project_settings(root_path).get("selection_rules", {}), rules)
+        except (TypeError, ValueError):
+            continue
+    return rules
+
+# Più radici esportate insieme; i percorsi relativi sono prefissati dal nome della radice
+class Workspace:
+    def __init__(self, roots):
+        # roots: lista di (percorso, ScanRules)
+        self.roots = []
+        used_names = set()
+        for root_path, rules in roots:
+            root_path = Path(root_path)
+            name = root_path.name or str(root_path)
+            suffix = 2
+            while name in used_names:
+                name = f"{root_path.name}-{suffix}"
+                suffix += 1
+            used_names.add(name)
+            self.roots.append((name, root_path, rules))
+        # Le radici più profonde prima, per gestire radici annidate
+        self._lookup = sorted(((root_path.parts, name) for name, root_path, rules in self.roots), key=lambda item: -len(item[0]))
+
+    def __str__(self):
+        return "; ".join(str(root_path) for name, root_path, rules in self.roots)
+
+    def relative_path(self, path):
+        parts = Path(path).parts
+        for root_parts, name in self._lookup:
+            if parts[:len(root_parts)] == root_parts:
+                return Path(name, *parts[len(root_parts):])
+        raise ValueError(f"{path} is not inside any workspace root")
+
+    def scan(self, perf=None, is_active=None, max_workers=None):
+        # Scansiona le radici in parallelo e le unisce sotto un unico Node;
+        # restituisce (nodo, esclusi, selezionati, dimensione, statistiche per radice)
+        from concurrent.futures import ThreadPoolExecutor
+        perf = perf or PerfRecorder()
+        
+        def scan_root(root):
+            name, root_path, rules = root
+            start = time.perf_counter()
+            scanner = ProjectScanner(rules, perf, is_active=is_active)
+            root_node, excluded_count, selected_count, total_size = scanner.build_tree(root_path)
+            root_node.name = name
+            stats = {
+                "name": name,
+                "path": str(root_path),
+                "excluded": excluded_count,
+                "selected": selected_count,
+                "size": total_size,
+                "scan_s": time.perf_counter() - start
+            }
+            stats.update(scanner.link_stats)
+            return root_node, stats
+        
+        with ThreadPoolExecutor(max_workers=max_workers or min(8, len(self.roots) or 1)) as executor:
+            results = list(executor.map(scan_root, self.roots))
+        
+        workspace_node = Node("Workspace", Path(os.path.commonpath([str(root_path) for name, root_path, rules in self.roots])), False, True)
+        root_stats = []
+        for root_node, stats in results:
+            workspace_node.children.append(root_node)
+            root_stats.append(stats)
+        return (workspace_node,
+                sum(stats["excluded"] for stats in root_stats),
+                sum(stats["selected"] for stats in root_stats),
+                sum(stats["size"] for stats in root_stats),
+                root_stats)
+
+def relative_export_path(path, project_root):
+    # Percorso mostrato nell'esportazione, per un progetto singolo o un workspace
+    if isinstance(project_root, Workspace):
+        return project_root.relative_path(path)
+    return path.relative_to(project_root)
+
+def as_project_root(project_root):
+    return project_root if isinstance(project_root, Workspace) else Path(project_root)
+
+def job_roots(job):
+    # Radici di un job (batch o server): "root" oppure "roots" per un workspace
+    roots = job.get("roots") or [job.get("root")]
+    if not roots or not all(roots):
+        raise ValueError("Job has no root")
+    for root_path in roots:
+        if not os.path.isdir(root_path):
+            raise FileNotFoundError(f"Folder not found: {root_path}")
+    return roots
 
-# Classe per le label colorate
-class ColoredLabel(tk.Label):
-    def __init__(self, master=None, **kwargs):
-        self.emoji = kwargs.pop("emoji", None)
-        super().__init__(master, **kwargs)
+def scan_roots(roots, rules, perf=None, max_workers=1):
+    # Scansione di un progetto singolo o di un workspace di più radici.
+    # Restituisce (nodo radice, radice del progetto, esclusi, selezionati, dimensione)
+    if len(roots) > 1:
+        project_root = Workspace([(root_path, load_project_rules(root_path, rules)) for root_path in roots])
+        root_node, excluded_count, selected_count, total_size, root_stats = project_root.scan(perf, max_workers=max_workers)
+    else:
+        project_root = Path(roots[0])
+        scanner = ProjectScanner(load_project_rules(project_root, rules), perf)
+        root_node, excluded_count, selected_count, total_size = scanner.build_tree(project_root)
+    return root_node, project_root, excluded_count, selected_count, total_size
+
+def job_export_options(job):
+    # Trasformazione del contenuto e limite di dimensione richiesti da un job
+    minify = job.get("minify")
+    transform = SourceTransform(**minify) if isinstance(minify, dict) else SourceTransform() if minify else None
+    size_limit = SizeLimit.parse(str(job["max_file_size"])) if job.get("max_file_size") else None
+    return transform, size_limit
+
+def job_nodes(job, root_node):
+    # File esportati: tutti quelli non esclusi, oppure quelli scelti dai pattern "select"/"deselect";
+    # con "budget" l'auto-selezione sceglie tra questi secondo "selection_rules" (che si
+    # aggiungono a quelle di PROJECT_RULES_FILE)
+    if job.get("select") or job.get("deselect"):
+        nodes = SelectionProfile(job.get("select") or ["*"], job.get("deselect")).match(root_node)
+    else:
+        nodes = [node for node in iter_files(root_node) if not node.is_excluded]
+    if job.get("budget"):
+        budget, unit = parse_budget(str(job["budget"]))
+        rules = SelectionRules.from_dict(job.get("selection_rules") or {}, load_selection_rules(job_roots(job)))
+        chosen = set(id(node) for node in auto_select(root_node, budget, unit, rules, candidates_only=nodes)[0])
+        nodes = [node for node in nodes if id(node) in chosen]
+    return nodes
+
+def run_batch_job(job):
+    # Esegue un job di esportazione senza interfaccia (anche in un processo separato).
+    # Non solleva eccezioni: gli errori finiscono nel risultato del job
+    start = time.perf_counter()
+    result = {"name": job.get("name") or job.get("output"), "output": job.get("output"), "status": "ok"}
+    try:
+        if not job.get("output"):
+            raise ValueError("Job has no output")
+        rules = ScanRules.from_dict(job)
+        root_node, project_root, excluded_count, selected_count, total_size = scan_roots(job_roots(job), rules)
+        result["scan_s"] = time.perf_counter() - start
+        
+        nodes = job_nodes(job, root_node)
+        mode = job.get("mode", "content")
+        transform, size_limit = job_export_options(job)
+        perf = PerfRecorder()
+        export_start = time.perf_counter()
+        output_path = job["output"]
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        
+        if mode == "structure":
+            write = STRUCTURE_FORMATS.get(job.get("format", "classic"))
+            if write is None:
+                raise ValueError(f"Unknown structure format: {job['format']}")
+            with open(output_path, 'w', encoding='utf-8') as f:
+                write(f, root_node, nodes, size_limit)
+            outputs = [output_path]
+        elif mode == "content" and job.get("max_part_size"):
+            limit, unit = parse_budget(str(job["max_part_size"]))
+            outputs, manifest_path = export_shards(nodes, project_root, output_path, limit, unit, max_workers=1,
+                                                   newlines=job.get("newlines", True), transform=transform, size_limit=size_limit)
+        elif mode == "content" and job.get("incremental"):
+            stats = export_incremental(nodes, project_root, output_path, job.get("newlines", True), transform, size_limit)
+            perf.count("export.bytes_saved", stats["bytes_saved"])
+            outputs = [output_path]
+        elif mode == "content":
+            with open(output_path, 'wb') as f:
+                write_contents(f, nodes, project_root, perf=perf, newlines=job.get("newlines", True),
+                               transform=transform, max_workers=1, size_limit=size_limit)
+            outputs = [output_path]
+        else:
+            raise ValueError(f"Unknown mode: {mode}")
+        
+        result.update({
+            "files": len(nodes),
+            "excluded": excluded_count,
+            "source_bytes": sum(node.size for node in nodes),
+            "outputs": outputs,
+            "bytes_written": sum(os.path.getsize(path) for path in outputs),
+            "bytes_saved": perf.counters.get("export.bytes_saved", 0),
+            "capped_files": sum(1 for node in nodes if size_limit.exceeds(node)) if size_limit is not None else 0,
+            "export_s": time.perf_counter() - export_start
+        })
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["total_s"] = time.perf_counter() - start
+    return result
+
+def load_batch_jobs(job_file):
+    # File JSON: {"defaults": {...}, "jobs": [{...}, ...]} oppure solo la lista dei job.
+    # I percorsi relativi sono risolti rispetto alla cartella del file dei job
+    with open(job_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"jobs": data}
+    base_dir = os.path.dirname(os.path.abspath(job_file))
+    defaults = data.get("defaults", {})
+    jobs = []
+    for entry in data.get("jobs", []):
+        job = dict(defaults)
+        job.update(entry)
+        for key in ("root", "output"):
+            if job.get(key):
+                job[key] = os.path.join(base_dir, os.path.expanduser(job[key]))
+        if job.get("roots"):
+            job["roots"] = [os.path.join(base_dir, os.path.expanduser(root_path)) for root_path in job["roots"]]
+        jobs.append(job)
+    return jobs
+
+def run_isolated_batch_job(job):
+    # Esegue un job in un processo dedicato: se il processo termina in modo
+    # anomalo fallisce solo questo job
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(run_batch_job, job).result()
+
+def run_batch(job_file, report_path=None, max_workers=None, log=print):
+    # Distribuisce i job su un pool di processi e scrive un report JSON
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+    jobs = load_batch_jobs(job_file)
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(jobs) or 1))
+    start = time.perf_counter()
+    results = [None] * len(jobs)
+    interrupted = []
+    
+    def collect(futures, isolated):
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                # Un processo del pool condiviso è terminato in modo anomalo: tutti i job
+                # non ancora completati falliscono insieme e vengono ripetuti isolati
+                if not isolated:
+                    interrupted.append(index)
+                    continue
+                result = {"name": jobs[index].get("name") or jobs[index].get("output"), "output": jobs[index].get("output"),
+                          "status": "error", "error": f"Worker process terminated abruptly ({e})"}
+            except Exception as e:
+                result = {"name": jobs[index].get("name") or jobs[index].get("output"), "output": jobs[index].get("output"),
+                          "status": "error", "error": f"{type(e).__name__}: {e}"}
+            results[index] = result
+            if result["status"] == "ok":
+                log(f"✅ {result['name']}: {result['files']} files, {result['bytes_written']} bytes in {result['total_s']:.2f}s")
+            else:
+                log(f"❌ {result['name']}: {result['error']}")
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        collect({executor.submit(run_batch_job, job): index for index, job in enumerate(jobs)}, False)
     
-    def update_colors(self):
-        if hasattr(self, "app") and self.app and self.emoji:
-            self.configure(fg=self.app.theme.get_emoji_color(self.emoji))
+    if interrupted:
+        log(f"⚠️ A worker process crashed, retrying {len(interrupted)} jobs in separate processes")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            collect({executor.submit(run_isolated_batch_job, jobs[index]): index for index in sorted(interrupted)}, True)
+    
+    report = {
+        "job_file": os.path.abspath(job_file),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "workers": max_workers,
+        "duration_s": time.perf_counter() - start,
+        "jobs_total": len(jobs),
+        "jobs_ok": sum(1 for result in results if result["status"] == "ok"),
+        "jobs_failed": sum(1 for result in results if result["status"] != "ok"),
+        "bytes_written": sum(result.get("bytes_written", 0) for result in results),
+        "jobs": results
+    }
+    report_path = report_path or os.path.splitext(job_file)[0] + ".report.json"
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    log(f"{report['jobs_ok']}/{report['jobs_total']} jobs completed in {report['duration_s']:.2f}s, report saved to {report_path}")
+    return report
 
-# Classe Node per la struttura ad albero
-class Node:
-    def __init__(self, name, path, is_excluded, is_dir):
-        self.name = name
-        self.path = path
-        self.is_excluded = is_excluded
-        self.is_dir = is_dir
-        self.children = []
+class ScanCache:
+    # Alberi già scansionati, riusati finché le cartelle non cambiano (LRU).
+    # Aggiungere, rimuovere o rinominare un file cambia l'mtime della sua cartella;
+    # una modifica sul posto invece no: il contenuto viene comunque riletto a ogni
+    # esportazione e dimensioni e mtime dei file usati si aggiornano con refresh_files
+    
+    # Le cartelle modificate poco prima della scansione vengono riscansionate alla
+    # richiesta successiva: alcuni file system hanno mtime con risoluzione grossolana
+    MTIME_MARGIN_NS = 2 * 1000 * 1000 * 1000
+
+    def __init__(self, max_entries=8):
+        from collections import OrderedDict
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def _dir_mtimes(cls, root_nodes, scan_start_ns):
+        # mtime di tutte le cartelle scansionate (-1 = da riscansionare comunque)
+        mtimes = {}
+        stack = list(root_nodes)
+        while stack:
+            node = stack.pop()
+            if not node.is_dir:
+                continue
+            try:
+                mtime = os.stat(node.path).st_mtime_ns
+            except OSError:
+                mtime = -1
+            mtimes[str(node.path)] = -1 if mtime >= scan_start_ns - cls.MTIME_MARGIN_NS else mtime
+            stack.extend(node.children)
+        return mtimes
+
+    @staticmethod
+    def _is_fresh(mtimes):
+        for path, mtime in mtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def get(self, roots, rules):
+        # Restituisce (voce, True se servita dalla cache); la voce contiene
+        # root_node, project_root, excluded, selected, size e scan_s
+        key = (tuple(os.path.abspath(root_path) for root_path in roots), json.dumps(vars(rules), sort_keys=True))
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and self._is_fresh(entry["mtimes"]):
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                self.hits += 1
+            return entry, True
+        
+        scan_start_ns = int(time.time() * 1e9)
+        start = time.perf_counter()
+        root_node, project_root, excluded_count, selected_count, total_size = scan_roots(list(key[0]), rules)
+        root_nodes = root_node.children if isinstance(project_root, Workspace) else [root_node]
+        entry = {
+            "root_node": root_node,
+            "project_root": project_root,
+            "excluded": excluded_count,
+            "selected": selected_count,
+            "size": total_size,
+            "scan_s": time.perf_counter() - start,
+            "mtimes": self._dir_mtimes(root_nodes, scan_start_ns)
+        }
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.misses += 1
+        return entry, False
+
+    @staticmethod
+    def refresh_files(nodes):
+        # Aggiorna dimensione e mtime dei file di un albero in cache prima di usarli
+        for node in nodes:
+            try:
+                stat = os.stat(node.path)
+            except OSError:
+                continue
+            if (node.size, node.mtime) != (stat.st_size, stat.st_mtime):
+                node.size = stat.st_size
+                node.mtime = stat.st_mtime
+                node.tokens = None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": [
+                    {"roots": list(roots), "files": entry["selected"], "folders": len(entry["mtimes"]), "scan_s": entry["scan_s"]}
+                    for (roots, rules_key), entry in self.entries.items()
+                ],
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+# Chiavi delle richieste al server che contengono liste separate da virgole
+SERVER_LIST_KEYS = ("exclude_folders", "exclude_files", "exclude_extensions", "include_extensions", "select", "deselect")
+
+def job_from_query(query):
+    # Converte i parametri di una richiesta (/export?root=...&mode=...) in un job come quelli batch
+    job = {"roots": query.get("root", [])}
+    for key, values in query.items():
+        if key == "root":
+            continue
+        value = values[-1]
+        if key in SERVER_LIST_KEYS:
+            job[key] = [item for item in value.split(",") if item]
+        elif key in ("minify", "newlines", "show_excluded", "follow_symlinks"):
+            job[key] = value.lower() in ("1", "true", "yes", "on")
+        else:
+            job[key] = value
+    return job
+
+def create_export_server(port=8765, cache=None, host="127.0.0.1"):
+    # Server HTTP locale: GET /export streamma l'esportazione, GET /stats descrive
+    # la cache, POST /invalidate la svuota. Ogni richiesta ha il suo thread
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+    cache = cache or ScanCache()
+    
+    class ExportRequestHandler(BaseHTTPRequestHandler):
+        # HTTP/1.0: la fine della risposta è la chiusura della connessione, così
+        # l'esportazione può essere scritta man mano senza conoscerne la lunghezza
+        protocol_version = "HTTP/1.0"
+        server_version = "CodeExporter"
+
+        def send_json(self, status, data):
+            body = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def host_allowed(self):
+            # Solo richieste indirizzate a localhost: un Host diverso indica una pagina web
+            # che prova a raggiungere il server tramite DNS rebinding
+            port = self.server.server_address[1]
+            names = ("127.0.0.1", "localhost", "[::1]")
+            allowed = {f"{name}:{port}" for name in names}
+            if port == 80:
+                allowed.update(names)
+            if (self.headers.get("Host") or "").lower() in allowed:
+                return True
+            self.send_json(403, {"error": "Forbidden host"})
+            return False
+
+        def do_GET(self):
+            if not self.host_allowed():
+                return
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                self.send_json(200, cache.stats())
+                return
+            if url.path != "/export":
+                self.send_json(404, {"error": f"Unknown path: {url.path}"})
+                return
+            
+            try:
+                job = job_from_query(parse_qs(url.query))
+                mode = job.get("mode", "content")
+                if mode not in ("content", "structure"):
+                    raise ValueError(f"Unknown mode: {mode}")
+                write_tree = STRUCTURE_FORMATS.get(job.get("format", "classic"))
+                if write_tree is None:
+                    raise ValueError(f"Unknown structure format: {job['format']}")
+                roots = job_roots(job)
+                transform, size_limit = job_export_options(job)
+                entry, cached = cache.get(roots, ScanRules.from_dict(job))
+                nodes = job_nodes(job, entry["root_node"])
+                if cached:
+                    # La struttura mostra le dimensioni di tutti i file, il contenuto solo di quelli esportati
+                    cache.refresh_files([node for node in iter_files(entry["root_node"]) if not node.is_excluded]
+                                        if mode == "structure" else nodes)
+            except (ValueError, OSError) as e:
+                self.send_json(400, {"error": f"{type(e).__name__}: {e}"})
+                return
+            except Exception as e:
+                self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            
+            self.send_response(200)
+            json_output = mode == "structure" and write_tree is write_structure_json
+            self.send_header("Content-Type", "application/json; charset=utf-8" if json_output else "text/plain; charset=utf-8")
+            self.send_header("X-Cache", "hit" if cached else "miss")
+            self.send_header("X-Files", str(len(nodes)))
+            self.end_headers()
+            try:
+                if mode == "structure":
+                    import io
+                    f = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+                    write_tree(f, entry["root_node"], nodes, size_limit)
+                    f.detach()
+                else:
+                    write_contents(self.wfile, nodes, entry["project_root"], newlines=job.get("newlines", True),
+                                   transform=transform, size_limit=size_limit)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Il client ha chiuso la connessione
+
+        def do_POST(self):
+            if not self.host_allowed():
+                return
+            if urlparse(self.path).path != "/invalidate":
+                self.send_json(404, {"error": f"Unknown path: {self.path}"})
+                return
+            cache.clear()
+            self.send_json(200, {"cleared": True})
+    
+    class ExportServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+    
+    return ExportServer((host, port), ExportRequestHandler)
+
+def serve_exports(port=8765, cache_size=8):
+    server = create_export_server(port, ScanCache(cache_size))
+    host, port = server.server_address[:2]
+    print(f"Code Exporter server listening on http://{host}:{port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 # Tema moderno con colori arancione e ciano
 class ModernTheme:
@@ -89,6 +2460,7 @@ class ModernTheme:
                     "🌙": "#af52de",
                     "☀️": "#ffcc00",
                     "ℹ️": "#5ac8fa",
+                    "📈": "#34c759",
                     "📂": "#ff9500"
                 }
             }
@@ -101,23 +2473,26 @@ class ModernTheme:
         return self.themes["light"]["emoji_colors"].get(emoji, self.get("fg"))
 
 class CodeExporterApp:
+    # Intervallo del battito e soglia oltre la quale un ritardo è un blocco
+    HEARTBEAT_INTERVAL_MS = 50
+    STALL_THRESHOLD = 0.1
+    
     def __init__(self, root):
+        init_start = time.perf_counter()
+        self.startup_times = {"imports_and_root_s": init_start - _STARTUP_TIME}
+        self.startup_callbacks = []
+        self.credits_window = None
+        
         self.root = root
         self.root.title("Code Exporter")
         self.root.geometry("1200x800")
         self.root.configure(bg="#f5f5f7")
         self.root.minsize(1000, 700)
         
-        # Imposta l'icona della finestra
-        try:
-            icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "icon.ico")
-            if os.path.exists(icon_path):
-                self.root.iconbitmap(icon_path)
-                self.icon_path = icon_path
-            else:
-                self.icon_path = None
-        except:
-            self.icon_path = None
+        # L'icona della finestra viene caricata dopo la prima visualizzazione
+        assets_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+        icon_path = os.path.join(assets_path, "icon.ico")
+        self.icon_path = icon_path if os.path.exists(icon_path) else None
         
         # Tema
         self.theme = ModernTheme()
@@ -126,29 +2501,81 @@ class CodeExporterApp:
         self.project_path = tk.StringVar()
         self.file_tree = {}
         self.show_excluded = tk.BooleanVar(value=False)
+        self.follow_symlinks = tk.BooleanVar(value=True)
         self.selected_count = tk.StringVar(value="0")
         self.excluded_count = tk.StringVar(value="0")
         self.total_size = tk.StringVar(value="0")
+        self.total_tokens = tk.StringVar(value="0")
+        self.exact_tokens = tk.BooleanVar(value=False)
+        self.incremental_export = tk.BooleanVar(value=False)
+        self.include_diffs = tk.BooleanVar(value=False)
+        self.normalize_newlines = tk.BooleanVar(value=True)
+        self.strip_comments = tk.BooleanVar(value=False)
+        
+        # Sorgente della scansione: None per l'intera cartella, altrimenti il ref git di base
+        self.git_base_ref = None
+        self.git_diffs = {}
+        
+        # Workspace con più radici (None per un singolo progetto)
+        self.workspace = None
+        self.root_stats = []
+        
+        # Stima dei token in background
+        self.token_estimator = TokenEstimator()
+        self.token_generation = 0
+        self.root_node = None
+        
+        # Nodi dei file con la spunta: la selezione viene letta da qui, non dalla Treeview
+        self.checked_nodes = set()
         
-        self.exclude_folders = ['node_modules', '.git', '.next', '.venv', 'venv', '__pycache__', '.idea', '.vscode']
-        self.exclude_files = ['package-lock.json', 'yarn.lock', '.DS_Store']
-        self.exclude_extensions = [
-            '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp', '.ico', '.tiff', '.psd',
-            '.mp3', '.wav', '.ogg', '.flac', '.aac', '.m4a', '.wma', '.opus',
-            '.mp4', '.mov', '.avi', '.mkv', '.flv', '.webm', '.wmv', '.m4v', '.3gp',
-            '.pdf', '.zip', '.tar', '.gz', '.7z', '.rar', '.exe', '.dll', '.so', '.dylib'
-        ]
-        self.include_extensions = ['.py', '.js', '.ts', '.tsx', '.jsx', '.html', '.css', '.json', '.env', '.md', '.txt', '.yml', '.yaml', '.xml', '.csv', '.ini', '.cfg', '.conf']
+        # Ricerca nel contenuto dei file
+        self.content_search = ContentSearch()
+        self.search_generation = 0
+        self.search_matches = []
+        self.search_items = {}
+        self.last_search = ""
+        
+        # Selezione automatica con budget
+        self.selection_rules = SelectionRules()
+        self.last_budget = "500KB"
+        self.last_part_limit = "1MB"
+        self.last_structure_format = "classic"
+        
+        # Limite di dimensione per file nell'esportazione (None = nessun limite)
+        self.size_limit = None
+        
+        # Profilo da riapplicare dopo ogni nuova scansione dello stesso progetto
+        self.active_profile = None
+        self.active_profile_name = None
+        self.active_profile_key = None
+        
+        self.exclude_folders = list(DEFAULT_EXCLUDE_FOLDERS)
+        self.exclude_files = list(DEFAULT_EXCLUDE_FILES)
+        self.exclude_extensions = list(DEFAULT_EXCLUDE_EXTENSIONS)
+        self.include_extensions = list(DEFAULT_INCLUDE_EXTENSIONS)
         
         self.queue = queue.Queue()
         self.scan_active = False
         self.scan_thread = None
         
-        # Creazione UI
+        # Strumentazione delle prestazioni
+        self.perf = PerfRecorder()
+        self.last_heartbeat = None
+        
+        # Creazione UI (solo le parti essenziali, il resto dopo la prima visualizzazione)
+        widgets_start = time.perf_counter()
         self.create_widgets()
+        self.startup_times["create_widgets_s"] = time.perf_counter() - widgets_start
+        self.perf.info["startup"] = self.startup_times
         
         # Controlla periodicamente la coda
         self.root.after(100, self.process_queue)
+        
+        # Rileva i blocchi del thread principale di Tk
+        self.root.after(self.HEARTBEAT_INTERVAL_MS, self.monitor_main_thread)
+        
+        # Completa l'avvio quando la finestra è stata disegnata
+        self.root.after_idle(self.on_first_idle)
     
     def create_widgets(self):
         # Frame principale con padding
@@ -168,38 +2595,15 @@ class CodeExporterApp:
         header_left = tk.Frame(header_container, bg=self.theme.get("header_bg"))
         header_left.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
-        # Logo (icona o emoji)
-        if self.icon_path:
-            try:
-                self.logo_image = tk.PhotoImage(file=self.icon_path)
-                self.logo_label = tk.Label(
-                    header_left, 
-                    image=self.logo_image,
-                    bg=self.theme.get("header_bg"),
-                    width=40,
-                    height=40
-                )
-                self.logo_label.pack(side=tk.LEFT, padx=(20, 15))
-            except:
-                # Fallback a emoji se l'icona non può essere caricata
-                self.logo_label = self.create_colored_label(
-                    header_left, 
-                    text="📂", 
-                    font=("Segoe UI Emoji", 32),
-                    bg=self.theme.get("header_bg"),
-                    emoji="📂"
-                )
-                self.logo_label.pack(side=tk.LEFT, padx=(20, 15))
-        else:
-            # Usa emoji se l'icona non è disponibile
-            self.logo_label = self.create_colored_label(
-                header_left, 
-                text="📂", 
-                font=("Segoe UI Emoji", 32),
-                bg=self.theme.get("header_bg"),
-                emoji="📂"
-            )
-            self.logo_label.pack(side=tk.LEFT, padx=(20, 15))
+        # Logo: emoji subito, sostituita dall'icona in load_icons()
+        self.logo_label = self.create_colored_label(
+            header_left, 
+            text="📂", 
+            font=("Segoe UI Emoji", 32),
+            bg=self.theme.get("header_bg"),
+            emoji="📂"
+        )
+        self.logo_label.pack(side=tk.LEFT, padx=(20, 15))
         
         # Titolo e sottotitolo
         title_container = tk.Frame(header_left, bg=self.theme.get("header_bg"))
@@ -245,6 +2649,22 @@ class CodeExporterApp:
         )
         self.credits_btn.pack(side=tk.RIGHT, padx=5)
         
+        # Pulsante diagnostica
+        self.diagnostics_btn = tk.Button(
+            header_buttons, 
+            text="📈", 
+            font=("Segoe UI Emoji", 16),
+            bg=self.theme.get("header_bg"),
+            fg=self.theme.get_emoji_color("📈"),
+            bd=0,
+            highlightthickness=0,
+            padx=8,
+            pady=5,
+            cursor="hand2",
+            command=self.show_diagnostics
+        )
+        self.diagnostics_btn.pack(side=tk.RIGHT, padx=5)
+        
         # Frame per la selezione cartella
         folder_frame = tk.Frame(self.main_frame, bg=self.theme.get("card_bg"), relief=tk.RAISED, bd=1)
         folder_frame.pack(fill=tk.X, pady=(0, 20))
@@ -294,6 +2714,42 @@ class CodeExporterApp:
         )
         browse_btn.pack(side=tk.LEFT)
         
+        changed_btn = tk.Button(
+            folder_content, 
+            text="🔀 Changed since...", 
+            font=("Segoe UI", 12, "bold"),
+            bg=self.theme.get("button_secondary_bg"),
+            fg=self.theme.get("button_secondary_fg"),
+            activebackground=self.theme.get("button_secondary_hover"),
+            relief="solid",
+            borderwidth=1,
+            highlightthickness=0,
+            highlightbackground=self.theme.get("button_secondary_border"),
+            padx=12,
+            pady=6,
+            cursor="hand2",
+            command=self.scan_changed_since
+        )
+        changed_btn.pack(side=tk.LEFT, padx=(10, 0))
+        
+        workspace_btn = tk.Button(
+            folder_content, 
+            text="🗂️ Workspace...", 
+            font=("Segoe UI", 12, "bold"),
+            bg=self.theme.get("button_bg"),
+            fg=self.theme.get("button_fg"),
+            activebackground=self.theme.get("button_hover"),
+            relief="solid",
+            borderwidth=1,
+            highlightthickness=0,
+            highlightbackground=self.theme.get("button_border"),
+            padx=12,
+            pady=6,
+            cursor="hand2",
+            command=self.select_workspace
+        )
+        workspace_btn.pack(side=tk.LEFT, padx=(10, 0))
+        
         # Frame per le statistiche
         self.stats_frame = tk.Frame(self.main_frame, bg=self.theme.get("card_bg"), relief=tk.RAISED, bd=1)
         self.stats_frame.pack(fill=tk.X, pady=(0, 20))
@@ -309,13 +2765,19 @@ class CodeExporterApp:
         self.create_stat_card(stats_container, "✅ Selected", self.selected_count, self.theme.get("success"), 0)
         self.create_stat_card(stats_container, "❌ Excluded", self.excluded_count, self.theme.get("danger"), 1)
         self.create_stat_card(stats_container, "📏 Total size", self.total_size, self.theme.get("info"), 2)
+        self.create_stat_card(stats_container, "🔢 Tokens", self.total_tokens, self.theme.get("secondary"), 3)
         
         # Frame per i controlli
         self.controls_frame = tk.Frame(self.main_frame, bg=self.theme.get("card_bg"), relief=tk.RAISED, bd=1)
         self.controls_frame.pack(fill=tk.X, pady=(0, 20))
         
+        # Due righe: in alto la selezione, in basso opzioni ed esportazione.
+        # I bottoni di esportazione vengono disposti per primi, così restano sempre visibili
         controls_content = tk.Frame(self.controls_frame, bg=self.theme.get("card_bg"))
-        controls_content.pack(fill=tk.X, padx=15, pady=15)
+        controls_content.pack(fill=tk.X, padx=15, pady=(15, 5))
+        
+        export_row = tk.Frame(self.controls_frame, bg=self.theme.get("card_bg"))
+        export_row.pack(fill=tk.X, padx=15, pady=(5, 15))
         
         # Checkbox per mostrare file esclusi
         show_excluded_cb = tk.Checkbutton(
@@ -369,9 +2831,45 @@ class CodeExporterApp:
         )
         deselect_all_btn.pack(side=tk.LEFT, padx=5)
         
+        auto_select_btn = tk.Button(
+            controls_content, 
+            text="🎯 Auto-select", 
+            font=("Segoe UI", 12, "bold"),
+            bg=self.theme.get("button_bg"),
+            fg=self.theme.get("button_fg"),
+            activebackground=self.theme.get("button_hover"),
+            relief="solid",
+            borderwidth=1,
+            highlightthickness=0,
+            highlightbackground=self.theme.get("button_border"),
+            padx=12,
+            pady=6,
+            cursor="hand2",
+            command=self.auto_select_budget
+        )
+        auto_select_btn.pack(side=tk.LEFT, padx=5)
+        
+        profiles_btn = tk.Button(
+            controls_content, 
+            text="🔖 Profiles", 
+            font=("Segoe UI", 12, "bold"),
+            bg=self.theme.get("button_bg"),
+            fg=self.theme.get("button_fg"),
+            activebackground=self.theme.get("button_hover"),
+            relief="solid",
+            borderwidth=1,
+            highlightthickness=0,
+            highlightbackground=self.theme.get("button_border"),
+            padx=12,
+            pady=6,
+            cursor="hand2",
+            command=self.manage_profiles
+        )
+        profiles_btn.pack(side=tk.LEFT, padx=5)
+        
         # Bottoni di esportazione
         export_btn = tk.Button(
-            controls_content, 
+            export_row, 
             text="💾 Export Content", 
             font=("Segoe UI", 12, "bold"),
             bg=self.theme.get("button_secondary_bg"),
@@ -388,8 +2886,26 @@ class CodeExporterApp:
         )
         export_btn.pack(side=tk.RIGHT, padx=5)
         
+        export_parts_btn = tk.Button(
+            export_row, 
+            text="🧩 Export Parts", 
+            font=("Segoe UI", 12, "bold"),
+            bg=self.theme.get("button_secondary_bg"),
+            fg=self.theme.get("button_secondary_fg"),
+            activebackground=self.theme.get("button_secondary_hover"),
+            relief="solid",
+            borderwidth=1,
+            highlightthickness=0,
+            highlightbackground=self.theme.get("button_secondary_border"),
+            padx=12,
+            pady=6,
+            cursor="hand2",
+            command=self.export_parts
+        )
+        export_parts_btn.pack(side=tk.RIGHT, padx=5)
+        
         export_structure_btn = tk.Button(
-            controls_content, 
+            export_row, 
             text="📁 Export Structure", 
             font=("Segoe UI", 12, "bold"),
             bg=self.theme.get("button_bg"),
@@ -406,6 +2922,45 @@ class CodeExporterApp:
         )
         export_structure_btn.pack(side=tk.RIGHT, padx=5)
         
+        # Menu con le opzioni di scansione ed esportazione
+        options_btn = tk.Menubutton(
+            export_row, 
+            text="⚙️ Options", 
+            font=("Segoe UI", 12, "bold"),
+            bg=self.theme.get("button_bg"),
+            fg=self.theme.get("button_fg"),
+            activebackground=self.theme.get("button_hover"),
+            activeforeground=self.theme.get("button_fg"),
+            relief="solid",
+            borderwidth=1,
+            highlightthickness=0,
+            padx=12,
+            pady=6,
+            cursor="hand2"
+        )
+        # Le voci del menu vengono aggiunte dopo la prima visualizzazione (build_options_menu)
+        self.options_menu = tk.Menu(options_btn, tearoff=0, font=("Segoe UI", 12))
+        options_btn.configure(menu=self.options_menu)
+        options_btn.pack(side=tk.LEFT, padx=5)
+        
+        search_btn = tk.Button(
+            export_row, 
+            text="🔍 Search", 
+            font=("Segoe UI", 12, "bold"),
+            bg=self.theme.get("button_bg"),
+            fg=self.theme.get("button_fg"),
+            activebackground=self.theme.get("button_hover"),
+            relief="solid",
+            borderwidth=1,
+            highlightthickness=0,
+            highlightbackground=self.theme.get("button_border"),
+            padx=12,
+            pady=6,
+            cursor="hand2",
+            command=self.search_content
+        )
+        search_btn.pack(side=tk.LEFT, padx=5)
+        
         # Progress bar (inizialmente nascosta)
         self.progress_frame = tk.Frame(self.main_frame, bg=self.theme.get("card_bg"), relief=tk.RAISED, bd=1)
         self.progress_frame.pack(fill=tk.X, pady=(0, 20))
@@ -455,30 +3010,81 @@ class CodeExporterApp:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Treeview
-        self.tree = ttk.Treeview(self.list_frame, columns=("selected",), show="tree headings", yscrollcommand=scrollbar.set, style="Modern.Treeview")
+        self.tree = ttk.Treeview(self.list_frame, columns=("selected", "tokens"), show="tree headings", yscrollcommand=scrollbar.set, style="Modern.Treeview")
         self.tree.heading("#0", text="Name")
         self.tree.heading("selected", text="✅")
+        self.tree.heading("tokens", text="🔢 Tokens")
         self.tree.column("selected", width=60, anchor=tk.CENTER)
+        self.tree.column("tokens", width=100, anchor=tk.E)
         self.tree.pack(fill=tk.BOTH, expand=True, padx=(15, 0), pady=(0, 15))
         scrollbar.config(command=self.tree.yview)
         
         # Configura i tag per i colori
         self.tree.tag_configure("included", foreground=self.theme.get("success"), font=("Segoe UI", 11, "bold"))
         self.tree.tag_configure("excluded", foreground=self.theme.get("danger"), font=("Segoe UI", 11))
+        self.tree.tag_configure("capped", foreground=self.theme.get("warning"), font=("Segoe UI", 11, "bold"))
+        self.tree.tag_configure("match", foreground=self.theme.get("accent"), font=("Segoe UI", 11, "bold"))
+        
+        # Bind per la selezione/deselezione singola
+        self.tree.bind("<ButtonRelease-1>", self.on_tree_click)
+        
+        # Configura gli stili
+        self.setup_styles()
+    
+    def on_first_idle(self):
+        # La finestra è visibile: avvia le parti non essenziali
+        self.startup_times["first_idle_s"] = time.perf_counter() - _STARTUP_TIME
+        self.root.after(1, self.finish_startup)
+    
+    def finish_startup(self):
+        deferred_start = time.perf_counter()
+        self.load_icons()
+        self.build_options_menu()
+        self.startup_times["deferred_s"] = time.perf_counter() - deferred_start
+        self.startup_times["total_s"] = time.perf_counter() - _STARTUP_TIME
+        
+        for callback in self.startup_callbacks:
+            callback(dict(self.startup_times))
+    
+    def load_icons(self):
+        # Icona della finestra e logo nell'header
+        if self.icon_path:
+            try:
+                self.root.iconbitmap(self.icon_path)
+            except:
+                pass
+        
+        if self.icon_path:
+            try:
+                self.logo_image = tk.PhotoImage(file=self.icon_path)
+                self.logo_label.configure(image=self.logo_image, text="", width=40, height=40)
+            except:
+                # Resta l'emoji se l'icona non può essere caricata
+                pass
+    
+    def build_options_menu(self):
+        # Voci del menu Options: non servono per il primo disegno della finestra
+        self.options_menu.add_checkbutton(label="🔗 Follow symlinks", variable=self.follow_symlinks, command=self.toggle_excluded_files)
+        self.options_menu.add_checkbutton(label="♻️ Incremental", variable=self.incremental_export)
+        self.options_menu.add_checkbutton(label="🔀 Include diffs", variable=self.include_diffs)
+        self.options_menu.add_checkbutton(label="↵ Normalize line endings", variable=self.normalize_newlines)
+        self.options_menu.add_checkbutton(label="✂️ Strip comments", variable=self.strip_comments)
         
-        # Bind per la selezione/deselezione singola
-        self.tree.bind("<ButtonRelease-1>", self.on_tree_click)
+        # Checkbox per il tokenizer esatto (solo se tiktoken è installato)
+        if importlib.util.find_spec("tiktoken") is not None:
+            self.options_menu.add_checkbutton(label="🔢 Exact tokens", variable=self.exact_tokens, command=self.toggle_exact_tokens)
         
-        # Configura gli stili
-        self.setup_styles()
+        self.options_menu.add_separator()
+        self.options_menu.add_command(label="📏 Size limit...", command=self.set_size_limit)
     
     def create_colored_label(self, parent, **kwargs):
         emoji = kwargs.pop("emoji", None)
         
         if emoji:
+            # Il colore dell'emoji viene passato al costruttore, senza un configure in più
+            kwargs["fg"] = self.theme.get_emoji_color(emoji)
             label = ColoredLabel(parent, emoji=emoji, **kwargs)
             label.app = self
-            label.update_colors()
         else:
             label = tk.Label(parent, **kwargs)
         
@@ -544,8 +3150,16 @@ class CodeExporterApp:
             self.update_colored_labels_recursive(child)
     
     def show_credits(self):
+        # La finestra dei crediti viene costruita alla prima apertura e poi riusata
+        if self.credits_window is not None:
+            self.credits_window.deiconify()
+            self.credits_window.lift()
+            self.credits_window.grab_set()
+            return
+        
         # Crea una finestra popup per i crediti
         credits_window = tk.Toplevel(self.root)
+        self.credits_window = credits_window
         credits_window.title("Credits & License")
         credits_window.geometry("600x500")
         credits_window.configure(bg=self.theme.get("card_bg"))
@@ -682,12 +3296,102 @@ For more information, please refer to <https://unlicense.org/>"""
             padx=12,
             pady=6,
             cursor="hand2",
-            command=credits_window.destroy
+            command=self.hide_credits
         )
         close_btn.pack(pady=10)
+        credits_window.protocol("WM_DELETE_WINDOW", self.hide_credits)
+    
+    def hide_credits(self):
+        self.credits_window.grab_release()
+        self.credits_window.withdraw()
+    
+    def show_diagnostics(self):
+        # Finestra con le metriche di scansione ed esportazione
+        diagnostics_window = tk.Toplevel(self.root)
+        diagnostics_window.title("Diagnostics")
+        diagnostics_window.geometry("700x500")
+        diagnostics_window.configure(bg=self.theme.get("card_bg"))
+        diagnostics_window.transient(self.root)
+        
+        if self.icon_path:
+            try:
+                diagnostics_window.iconbitmap(self.icon_path)
+            except:
+                pass
+        
+        content_frame = tk.Frame(diagnostics_window, bg=self.theme.get("card_bg"))
+        content_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        report_text = tk.Text(
+            content_frame,
+            wrap=tk.NONE,
+            font=("Consolas", 11),
+            bg=self.theme.get("bg"),
+            fg=self.theme.get("fg"),
+            relief=tk.FLAT,
+            padx=10,
+            pady=10
+        )
+        report_text.pack(fill=tk.BOTH, expand=True, pady=(0, 15))
+        
+        def refresh():
+            report_text.configure(state="normal")
+            report_text.delete("1.0", tk.END)
+            report_text.insert("1.0", self.perf.format_summary())
+            report_text.configure(state="disabled")
+        
+        def save(chrome_trace):
+            output_path = filedialog.asksaveasfilename(
+                parent=diagnostics_window,
+                defaultextension=".json",
+                filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            )
+            if not output_path:
+                return
+            try:
+                if chrome_trace:
+                    self.perf.dump_chrome_trace(output_path)
+                else:
+                    self.perf.dump_json(output_path)
+            except Exception as e:
+                messagebox.showerror("❌ Error", f"Error saving diagnostics:\n{str(e)}", parent=diagnostics_window)
+        
+        buttons_frame = tk.Frame(content_frame, bg=self.theme.get("card_bg"))
+        buttons_frame.pack(fill=tk.X)
+        
+        for text, command in (("Refresh", refresh),
+                              ("Save JSON", lambda: save(False)),
+                              ("Save Chrome trace", lambda: save(True))):
+            button = tk.Button(
+                buttons_frame,
+                text=text,
+                font=("Segoe UI", 12, "bold"),
+                bg=self.theme.get("button_bg"),
+                fg=self.theme.get("button_fg"),
+                activebackground=self.theme.get("button_hover"),
+                relief="solid",
+                borderwidth=1,
+                highlightthickness=0,
+                highlightbackground=self.theme.get("button_border"),
+                padx=12,
+                pady=6,
+                cursor="hand2",
+                command=command
+            )
+            button.pack(side=tk.LEFT, padx=(0, 10))
         
-        # Aggiorna i colori delle label nella finestra popup
-        self.update_colored_labels_recursive(credits_window)
+        refresh()
+    
+    def monitor_main_thread(self):
+        # Un battito in ritardo indica che il thread principale era bloccato
+        now = time.perf_counter()
+        interval = self.HEARTBEAT_INTERVAL_MS / 1000
+        if self.last_heartbeat is not None:
+            lag = now - self.last_heartbeat - interval
+            if lag >= self.STALL_THRESHOLD:
+                self.perf.record_stall(self.last_heartbeat + interval, lag)
+        self.last_heartbeat = now
+        self.root.after(self.HEARTBEAT_INTERVAL_MS, self.monitor_main_thread)
     
     def on_tree_click(self, event):
         # Gestisce la selezione/deselezione singola
@@ -700,61 +3404,131 @@ For more information, please refer to <https://unlicense.org/>"""
             
             # Inverti lo stato
             if current_value == "✔️":
-                self.tree.set(item, "selected", "")
+                self.set_checked(item, False)
             else:
                 # Controlla se il file è escluso
                 if item in self.file_tree and not self.file_tree[item][1]:  # [1] è is_excluded
-                    self.tree.set(item, "selected", "✔️")
+                    self.set_checked(item, True)
             
             # Aggiorna i contatori
             self.update_selection_count()
     
     def update_selection_count(self):
-        # Aggiorna il conteggio dei file selezionati
-        selected_count = 0
-        total_size = 0
-        
-        for item in self.tree.get_children():
-            if self.tree.set(item, "selected") == "✔️":
-                file_path = self.file_tree.get(item)
-                if file_path and file_path[0].is_file() and not file_path[1]:  # [1] è is_excluded
-                    selected_count += 1
-                    try:
-                        total_size += file_path[0].stat().st_size
-                    except:
-                        pass
-            selected_count, size = self._count_selected_files(item, selected_count, total_size)
+        # Aggiorna il conteggio dei file selezionati con i dati della scansione
+        selected_nodes = []
+        self._get_selected_nodes("", selected_nodes)
+        selected_count, total_size, total_tokens, pending = selection_totals(selected_nodes)
         
         self.selected_count.set(str(selected_count))
         self.total_size.set(self.format_size(total_size))
+        self.total_tokens.set(self.format_token_total(total_tokens, pending))
     
-    def _count_selected_files(self, parent, count, size):
-        for item in self.tree.get_children(parent):
-            if self.tree.set(item, "selected") == "✔️":
-                file_path = self.file_tree.get(item)
-                if file_path and file_path[0].is_file() and not file_path[1]:  # [1] è is_excluded
-                    count += 1
-                    try:
-                        size += file_path[0].stat().st_size
-                    except:
-                        pass
-            count, size = self._count_selected_files(item, count, size)
-        return count, size
+    def format_token_total(self, tokens, pending=0):
+        # "~" indica una stima euristica, "…" che il calcolo è ancora in corso
+        text = format_tokens(tokens)
+        if not self.token_estimator.is_exact:
+            text = "~" + text
+        if pending:
+            text += " …"
+        return text
     
     def select_folder(self):
         folder = filedialog.askdirectory()
         if folder:
             self.project_path.set(folder)
+            self.git_base_ref = None
+            self.workspace = None
+            self.clear_profile()
             self.start_scan()
     
+    def select_workspace(self):
+        # Chiede le cartelle una alla volta finché l'utente non ha finito
+        folders = []
+        while True:
+            folder = filedialog.askdirectory(title=f"Workspace root #{len(folders) + 1}")
+            if not folder:
+                break
+            if folder not in folders:
+                folders.append(folder)
+            if not messagebox.askyesno("🗂️ Workspace", f"{len(folders)} folders selected.\nAdd another folder?"):
+                break
+        
+        if not folders:
+            return
+        
+        base_rules = self.scan_rules()
+        self.workspace = Workspace([(folder, load_project_rules(folder, base_rules)) for folder in folders])
+        self.project_path.set(str(self.workspace))
+        self.git_base_ref = None
+        self.clear_profile()
+        self.start_scan()
+    
+    def export_root(self):
+        # Radice usata per i percorsi relativi nelle esportazioni
+        return self.workspace if self.workspace is not None else Path(self.project_path.get())
+    
+    def scan_changed_since(self):
+        if not self.project_path.get():
+            messagebox.showerror("❌ Error", "Please select a project folder!")
+            return
+        
+        ref = simpledialog.askstring(
+            "🔀 Changed since",
+            "Base git ref (branch, tag or commit):",
+            initialvalue=self.git_base_ref or "main",
+            parent=self.root
+        )
+        if not ref:
+            return
+        
+        self.git_base_ref = ref.strip()
+        self.workspace = None
+        self.start_scan()
+    
+    def scan_rules(self):
+        return ScanRules(self.exclude_folders, self.exclude_files, self.exclude_extensions,
+                         self.include_extensions, self.show_excluded.get(), self.follow_symlinks.get())
+    
+    def project_rules(self, root_path):
+        # Regole della finestra aggiornate con PROJECT_RULES_FILE della cartella;
+        # le opzioni della finestra restano valide come per i workspace
+        rules = load_project_rules(root_path, self.scan_rules())
+        rules.show_excluded = self.show_excluded.get()
+        rules.follow_symlinks = self.follow_symlinks.get()
+        return rules
+    
+    def create_scanner(self, rules):
+        return ProjectScanner(
+            rules,
+            self.perf,
+            on_progress=lambda count: self.queue.put(("progress", count)),
+            is_active=lambda: self.scan_active
+        )
+    
     def start_scan(self):
+        # Senza un profilo attivo la selezione corrente viene conservata come profilo temporaneo,
+        # ma solo se si sta riscansionando lo stesso progetto
+        key = self.project_key()
+        if self.root_node is not None and self.active_profile_name is None and self.active_profile_key == key:
+            selected_nodes = []
+            self._get_selected_nodes("", selected_nodes)
+            self.active_profile = SelectionProfile.from_selection(self.root_node, selected_nodes)
+        self.active_profile_key = key
+        
         # Reset UI
         for item in self.tree.get_children():
             self.tree.delete(item)
         self.file_tree = {}
+        self.checked_nodes = set()
+        self.root_node = None
+        self.token_generation += 1  # Annulla eventuali stime dei token in corso
+        self.search_generation += 1  # e le ricerche nel contenuto
+        self.search_matches = []
         self.selected_count.set("0")
         self.excluded_count.set("0")
         self.total_size.set("0")
+        self.total_tokens.set("0")
+        self.perf.reset()
         
         # Mostra progress bar
         self.progress_frame.pack(fill=tk.X, pady=(0, 20), after=self.controls_frame)
@@ -776,19 +3550,62 @@ For more information, please refer to <https://unlicense.org/>"""
     
     def scan_directory_thread(self):
         try:
+            if self.workspace is not None:
+                # Scansione parallela di tutte le radici del workspace
+                self.queue.put(("status", f"🗂️ Scanning {len(self.workspace.roots)} workspace roots..."))
+                show_excluded = self.show_excluded.get()
+                follow_symlinks = self.follow_symlinks.get()
+                for name, workspace_root, rules in self.workspace.roots:
+                    rules.show_excluded = show_excluded
+                    rules.follow_symlinks = follow_symlinks
+                with self.perf.phase("scan.build_tree"):
+                    result = self.workspace.scan(self.perf, is_active=lambda: self.scan_active)
+                self.git_diffs = {}
+                self.root_stats = result[4]
+                self.perf.info["workspace"] = {
+                    stats["name"]: f"{stats['selected']} files, {self.format_size(stats['size'])}, {stats['scan_s'] * 1000:.0f} ms"
+                    for stats in self.root_stats
+                }
+                if self.scan_active:
+                    self.queue.put(("scan_complete",) + result[:4])
+                else:
+                    self.queue.put(("status", "❌ Scan interrupted"))
+                return
+            self.root_stats = []
+            self.perf.info.pop("workspace", None)
+            
             root_path = Path(self.project_path.get())
             if not root_path.exists():
                 self.queue.put(("error", "The selected folder does not exist"))
                 return
             
+            if self.git_base_ref:
+                # Scansione limitata ai file modificati rispetto al ref git
+                self.queue.put(("status", f"🔀 Finding files changed since {self.git_base_ref}..."))
+                with self.perf.phase("scan.git_changed_files"):
+                    relative_paths, base = git_changed_files(root_path, self.git_base_ref)
+                with self.perf.phase("scan.git_diffs"):
+                    self.git_diffs = git_file_diffs(root_path, base)
+                rules = self.project_rules(root_path)
+                with self.perf.phase("scan.build_tree"):
+                    result = build_tree_from_paths(root_path, relative_paths, rules.is_excluded, rules.show_excluded)
+                self.perf.count("scan.entries", len(relative_paths))
+                self.queue.put(("scan_complete",) + result)
+                return
+            self.git_diffs = {}
+            
             self.queue.put(("status", "🔍 Analyzing structure..."))
             
+            scanner = self.create_scanner(self.project_rules(root_path))
+            
             # Prima conta i file totali per la progress bar
-            total_files = self.count_files(root_path)
+            with self.perf.phase("scan.count_files"):
+                total_files = scanner.count_files(root_path)
             self.queue.put(("total_files", total_files))
             
             # Esegui la scansione vera e propria
-            root_node, excluded_count, selected_count, total_size = self.build_tree(root_path)
+            with self.perf.phase("scan.build_tree"):
+                root_node, excluded_count, selected_count, total_size = scanner.build_tree(root_path)
             
             if self.scan_active:  # Solo se la scansione non è stata interrotta
                 self.queue.put(("scan_complete", root_node, excluded_count, selected_count, total_size))
@@ -797,89 +3614,6 @@ For more information, please refer to <https://unlicense.org/>"""
         except Exception as e:
             self.queue.put(("error", f"Error during scanning: {str(e)}"))
     
-    def count_files(self, current_path):
-        count = 0
-        try:
-            for item in current_path.iterdir():
-                if item.is_dir() and item.name in self.exclude_folders:
-                    continue
-                
-                if item.is_file() and item.name in self.exclude_files:
-                    continue
-                
-                if item.is_file() and item.suffix.lower() in self.exclude_extensions:
-                    continue
-                
-                if item.is_file() and item.suffix not in self.include_extensions:
-                    continue
-                
-                if item.is_dir():
-                    count += self.count_files(item)
-                else:
-                    count += 1
-        except PermissionError:
-            pass
-        
-        return count
-    
-    def build_tree(self, current_path):
-        node = Node(current_path.name, current_path, False, current_path.is_dir())
-        excluded_count = 0
-        selected_count = 0
-        total_size = 0
-        processed_count = 0
-        
-        try:
-            items = list(current_path.iterdir())
-            for item in items:
-                if not self.scan_active:
-                    break
-                    
-                processed_count += 1
-                
-                # Aggiorna periodicamente la coda per mostrare il progresso
-                if processed_count % 10 == 0:
-                    self.queue.put(("progress", processed_count))
-                
-                is_excluded = False
-                
-                if item.is_dir() and item.name in self.exclude_folders:
-                    is_excluded = True
-                
-                if item.is_file() and item.name in self.exclude_files:
-                    is_excluded = True
-                
-                if item.is_file() and item.suffix.lower() in self.exclude_extensions:
-                    is_excluded = True
-                
-                if item.is_file() and item.suffix not in self.include_extensions:
-                    is_excluded = True
-                
-                if not is_excluded or self.show_excluded.get():
-                    if item.is_dir():
-                        child_node, child_excluded, child_selected, child_size = self.build_tree(item)
-                        node.children.append(child_node)
-                        excluded_count += child_excluded
-                        selected_count += child_selected
-                        total_size += child_size
-                    else:
-                        child_node = Node(item.name, item, is_excluded, False)
-                        node.children.append(child_node)
-                        
-                        if is_excluded:
-                            excluded_count += 1
-                        else:
-                            selected_count += 1
-                            try:
-                                total_size += item.stat().st_size
-                            except:
-                                pass
-                    
-        except PermissionError:
-            pass
-        
-        return node, excluded_count, selected_count, total_size
-    
     def process_queue(self):
         try:
             while True:
@@ -908,12 +3642,50 @@ For more information, please refer to <https://unlicense.org/>"""
                     self.stop_scan()
                     
                     # Aggiorna l'interfaccia con i risultati
-                    self.insert_tree("", root_node)
+                    with self.perf.phase("ui.insert_tree"):
+                        self.insert_tree("", root_node)
+                    self.root_node = root_node
+                    self.show_root_stats()
                     
-                    self.excluded_count.set(str(excluded_count))
+                    # I link e i duplicati scartati vengono mostrati insieme agli esclusi
+                    pruned = sum(self.perf.counters.get(name, 0) for name in ("scan.cycles", "scan.duplicates", "scan.symlinks_skipped"))
+                    self.excluded_count.set(f"{excluded_count} (+{pruned} links)" if pruned else str(excluded_count))
                     self.selected_count.set(str(selected_count))
                     self.total_size.set(self.format_size(total_size))
-                    self.status_label.configure(text="✅ Scan completed")
+                    self.status_label.configure(text="✅ Scan completed" + self.format_link_stats())
+                    
+                    # Ripristina la selezione dal profilo attivo
+                    if self.active_profile is not None:
+                        with self.perf.phase("ui.apply_profile"):
+                            self.apply_selection(self.active_profile.match(root_node))
+                    
+                    # Avvia la stima dei token in background
+                    self.start_token_estimation()
+                
+                elif msg_type == "export_complete":
+                    _, message = msg
+                    self.status_label.configure(text="✅ Export completed")
+                    messagebox.showinfo("✅ Success", message)
+                
+                elif msg_type == "tokens_progress":
+                    _, generation, done, total = msg
+                    if generation == self.token_generation:
+                        self.update_selection_count()
+                
+                elif msg_type == "tokens_complete":
+                    _, generation = msg
+                    if generation == self.token_generation:
+                        self.apply_token_estimates()
+                
+                elif msg_type == "search_hits":
+                    _, generation, hits = msg
+                    if generation == self.search_generation:
+                        self.show_search_hits(hits)
+                
+                elif msg_type == "search_complete":
+                    _, generation, pattern, error = msg
+                    if generation == self.search_generation:
+                        self.finish_search(pattern, error)
                 
         except queue.Empty:
             pass
@@ -922,14 +3694,19 @@ For more information, please refer to <https://unlicense.org/>"""
         self.root.after(100, self.process_queue)
     
     def format_size(self, size_bytes):
-        if size_bytes < 1024:
-            return f"{size_bytes} bytes"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.2f} KB"
-        elif size_bytes < 1024 * 1024 * 1024:
-            return f"{size_bytes / (1024 * 1024):.2f} MB"
-        else:
-            return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
+        return format_size(size_bytes)
+    
+    def format_link_stats(self):
+        # Link simbolici saltati, cicli e duplicati scartati dall'ultima scansione
+        counters = self.perf.counters
+        parts = []
+        if counters.get("scan.cycles"):
+            parts.append(f"{counters['scan.cycles']} symlink cycles pruned")
+        if counters.get("scan.duplicates"):
+            parts.append(f"{counters['scan.duplicates']} duplicates pruned")
+        if counters.get("scan.symlinks_skipped"):
+            parts.append(f"{counters['scan.symlinks_skipped']} symlinks skipped")
+        return f" ({', '.join(parts)})" if parts else ""
     
     def stop_scan(self):
         self.progress.stop()
@@ -937,18 +3714,73 @@ For more information, please refer to <https://unlicense.org/>"""
         self.scan_active = False
     
     def insert_tree(self, parent_id, node):
-        item_id = self.tree.insert(parent_id, tk.END, text=node.name, values=("✔️",))
+        item_id = self.tree.insert(parent_id, tk.END, text=node.name, values=("✔️", ""))
         
         if node.is_excluded:
             self.tree.item(item_id, tags=("excluded",))
+        elif self.size_limit is not None and self.size_limit.exceeds(node):
+            self.tree.item(item_id, tags=("capped",))
         else:
             self.tree.item(item_id, tags=("included",))
         
-        self.file_tree[item_id] = (node.path, node.is_excluded)
+        self.file_tree[item_id] = (node.path, node.is_excluded, node)
+        self.checked_nodes.add(node)
         
         for child in node.children:
             self.insert_tree(item_id, child)
     
+    def show_root_stats(self):
+        # Nel workspace ogni radice mostra i propri file e la propria dimensione
+        if not self.root_stats:
+            return
+        top_items = self.tree.get_children()
+        if not top_items:
+            return
+        for item, stats in zip(self.tree.get_children(top_items[0]), self.root_stats):
+            self.tree.item(item, text=f"{stats['name']}  ({stats['selected']} files, {self.format_size(stats['size'])})")
+    
+    def start_token_estimation(self):
+        # Ogni nuova stima invalida i risultati di quelle precedenti
+        self.token_generation += 1
+        generation = self.token_generation
+        nodes = [node for node in iter_files(self.root_node) if not node.is_excluded]
+        
+        def is_cancelled():
+            return generation != self.token_generation
+        
+        def on_progress(done, total):
+            self.queue.put(("tokens_progress", generation, done, total))
+        
+        def run():
+            self.token_estimator.estimate_nodes(nodes, on_progress, is_cancelled)
+            self.queue.put(("tokens_complete", generation))
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def apply_token_estimates(self):
+        # Aggrega i token per cartella e li mostra nella colonna della Treeview
+        aggregate_tokens(self.root_node)
+        for item_id, (path, is_excluded, node) in self.file_tree.items():
+            if not is_excluded and node.tokens is not None:
+                self.tree.set(item_id, "tokens", format_tokens(node.tokens))
+        self.update_selection_count()
+    
+    def toggle_exact_tokens(self):
+        if self.exact_tokens.get():
+            tokenizer = load_tiktoken_tokenizer()
+            if tokenizer is None:
+                messagebox.showerror("❌ Error", "tiktoken is not available")
+                self.exact_tokens.set(False)
+                return
+            self.token_estimator.set_exact_tokenizer(tokenizer)
+        else:
+            self.token_estimator.set_exact_tokenizer(None)
+        
+        if self.root_node is not None:
+            for node in iter_files(self.root_node):
+                node.tokens = None
+            self.start_token_estimation()
+    
     def toggle_excluded_files(self):
         if self.scan_active:
             messagebox.showinfo("⏳ Wait", "Please wait for the current scan to complete")
@@ -956,28 +3788,269 @@ For more information, please refer to <https://unlicense.org/>"""
             
         self.start_scan()
     
+    def set_checked(self, item, checked):
+        # Aggiorna insieme la spunta nella Treeview e il modello della selezione
+        self.tree.set(item, "selected", "✔️" if checked else "")
+        node = self.file_tree[item][2]
+        if checked:
+            self.checked_nodes.add(node)
+        else:
+            self.checked_nodes.discard(node)
+    
     def select_all(self):
         for item in self.tree.get_children():
             if not self.file_tree[item][1]:  # Non selezionare file esclusi
-                self.tree.set(item, "selected", "✔️")
+                self.set_checked(item, True)
             self._select_children(item)
         self.update_selection_count()
     
     def deselect_all(self):
         for item in self.tree.get_children():
-            self.tree.set(item, "selected", "")
+            self.set_checked(item, False)
             self._deselect_children(item)
         self.update_selection_count()
     
+    def auto_select_budget(self):
+        if self.root_node is None:
+            messagebox.showerror("❌ Error", "Please scan a project folder first!")
+            return
+        
+        text = simpledialog.askstring(
+            "🎯 Auto-select",
+            "Budget (e.g. 500KB, 2MB, 100k tokens):",
+            initialvalue=self.last_budget,
+            parent=self.root
+        )
+        if not text:
+            return
+        
+        try:
+            budget, unit = parse_budget(text)
+        except ValueError as e:
+            messagebox.showerror("❌ Error", str(e))
+            return
+        self.last_budget = text
+        
+        # Le priorità si possono configurare con "selection_rules" in PROJECT_RULES_FILE
+        roots = [root_path for name, root_path, rules in self.workspace.roots] if self.workspace is not None else [self.project_path.get()]
+        rules = load_selection_rules(roots, self.selection_rules)
+        chosen, used = auto_select(self.root_node, budget, unit, rules)
+        self.apply_selection(chosen)
+        
+        used_text = self.format_size(used) if unit == "bytes" else f"{format_tokens(used)} tokens"
+        self.status_label.configure(text=f"🎯 Auto-selected {len(chosen)} files ({used_text})")
+    
+    def project_key(self):
+        return str(self.export_root().resolve()) if self.workspace is None else str(self.workspace)
+    
+    def clear_profile(self):
+        self.active_profile = None
+        self.active_profile_name = None
+        self.active_profile_key = None
+    
+    def manage_profiles(self):
+        if self.root_node is None:
+            messagebox.showerror("❌ Error", "Please scan a project folder first!")
+            return
+        
+        profiles = load_profiles(self.project_key())
+        names = ", ".join(sorted(profiles)) or "none"
+        name = simpledialog.askstring(
+            "🔖 Profiles",
+            f"Saved profiles: {names}\n\nName of the profile to load, or a new name to save the current selection:",
+            initialvalue=self.active_profile_name or "",
+            parent=self.root
+        )
+        if not name or not name.strip():
+            return
+        name = name.strip()
+        
+        if name in profiles and not messagebox.askyesno(
+            "🔖 Profiles", f"Load profile '{name}'?\n\nChoose No to overwrite it with the current selection."
+        ):
+            profiles.pop(name)
+        
+        if name in profiles:
+            profile = profiles[name]
+            chosen = profile.match(self.root_node)
+            self.apply_selection(chosen)
+            self.status_label.configure(text=f"🔖 Profile '{name}' applied ({len(chosen)} files)")
+        else:
+            patterns = simpledialog.askstring(
+                "🔖 Profiles",
+                "Optional patterns, separated by spaces (e.g. src/*.py *.md !*_test.py):",
+                parent=self.root
+            )
+            patterns = (patterns or "").split()
+            selected_nodes = []
+            self._get_selected_nodes("", selected_nodes)
+            profile = SelectionProfile.from_selection(
+                self.root_node, selected_nodes,
+                include=[pattern for pattern in patterns if not pattern.startswith("!")],
+                exclude=[pattern[1:] for pattern in patterns if pattern.startswith("!") and len(pattern) > 1]
+            )
+            try:
+                save_profile(self.project_key(), name, profile)
+            except OSError as e:
+                messagebox.showerror("❌ Error", f"Error saving profile:\n{str(e)}")
+                return
+            self.status_label.configure(text=f"🔖 Profile '{name}' saved ({len(profile.paths)} files)")
+        
+        # Il profilo viene riapplicato automaticamente dopo ogni nuova scansione
+        self.active_profile = profile
+        self.active_profile_name = name
+        self.active_profile_key = self.project_key()
+    
+    def search_content(self):
+        if self.root_node is None:
+            messagebox.showerror("❌ Error", "Please scan a project folder first!")
+            return
+        
+        pattern = simpledialog.askstring(
+            "🔍 Search",
+            "Regular expression to search in the scanned files\n(prefix with (?i) to ignore case):",
+            initialvalue=self.last_search,
+            parent=self.root
+        )
+        if not pattern:
+            return
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            messagebox.showerror("❌ Error", f"Invalid regular expression:\n{str(e)}")
+            return
+        self.last_search = pattern
+        
+        # Una nuova ricerca annulla quella precedente e ne toglie l'evidenziazione
+        self.search_generation += 1
+        generation = self.search_generation
+        self.clear_search_matches()
+        self.search_items = {id(node): item_id for item_id, (path, is_excluded, node) in self.file_tree.items()}
+        nodes = [node for node in iter_files(self.root_node) if not node.is_excluded]
+        self.status_label.configure(text=f"🔍 Searching {len(nodes)} files...")
+        
+        def is_cancelled():
+            return generation != self.search_generation
+        
+        def on_hits(hits):
+            self.queue.put(("search_hits", generation, hits))
+        
+        def run():
+            error = None
+            try:
+                self.content_search.search(pattern, nodes, on_hits, is_cancelled)
+            except Exception as e:
+                error = str(e)
+            self.queue.put(("search_complete", generation, pattern, error))
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def clear_search_matches(self):
+        for node, count in self.search_matches:
+            item_id = self.search_items.get(id(node))
+            if item_id is not None and self.tree.exists(item_id):
+                self.tree.item(item_id, tags=tuple(tag for tag in self.tree.item(item_id, "tags") if tag != "match"))
+        self.search_matches = []
+    
+    def show_search_hits(self, hits):
+        # Evidenzia i file trovati man mano che arrivano dal thread di ricerca
+        for node, count in hits:
+            item_id = self.search_items.get(id(node))
+            if item_id is not None:
+                self.tree.item(item_id, tags=tuple(self.tree.item(item_id, "tags")) + ("match",))
+        self.search_matches.extend(hits)
+        self.status_label.configure(text=f"🔍 {len(self.search_matches)} matching files so far...")
+    
+    def finish_search(self, pattern, error):
+        if error:
+            messagebox.showerror("❌ Error", f"Error during search:\n{error}")
+            return
+        
+        matches = len(self.search_matches)
+        occurrences = sum(count for node, count in self.search_matches)
+        self.status_label.configure(text=f"🔍 {matches} files match {pattern!r} ({occurrences} occurrences)")
+        if not matches:
+            messagebox.showinfo("🔍 Search", f"No files match {pattern!r}")
+            return
+        
+        # Sì: aggiunge i file trovati alla selezione, No: li toglie, Annulla: la lascia com'è
+        answer = messagebox.askyesnocancel(
+            "🔍 Search",
+            f"{matches} files match {pattern!r}.\n\n"
+            "Yes: select all matching files\nNo: deselect all matching files\nCancel: keep the current selection"
+        )
+        if answer is None:
+            return
+        selected_nodes = []
+        self._get_selected_nodes("", selected_nodes)
+        matching = set(id(node) for node, count in self.search_matches)
+        if answer:
+            selected_nodes.extend(node for node, count in self.search_matches)
+        else:
+            selected_nodes = [node for node in selected_nodes if id(node) not in matching]
+        self.apply_selection(selected_nodes)
+    
+    def set_size_limit(self):
+        text = simpledialog.askstring(
+            "📏 Size limit",
+            "Maximum size per exported file, optionally followed by skip, truncate or sample\n"
+            "(e.g. 1MB, 500KB truncate; empty for no limit):",
+            initialvalue=self.size_limit.to_text() if self.size_limit else "1MB sample",
+            parent=self.root
+        )
+        if text is None:
+            return
+        
+        try:
+            self.size_limit = SizeLimit.parse(text) if text.strip() else None
+        except ValueError as e:
+            messagebox.showerror("❌ Error", str(e))
+            return
+        
+        # Evidenzia nella Treeview i file oltre il limite
+        capped = 0
+        for item_id, (path, is_excluded, node) in self.file_tree.items():
+            if is_excluded or node.is_dir:
+                continue
+            if self.size_limit is not None and self.size_limit.exceeds(node):
+                self.tree.item(item_id, tags=("capped",))
+                capped += 1
+            else:
+                self.tree.item(item_id, tags=("included",))
+        
+        if self.size_limit is None:
+            self.status_label.configure(text="📏 No size limit")
+        else:
+            self.status_label.configure(text=f"📏 {capped} files over {self.format_size(self.size_limit.max_bytes)} will be {self.size_limit.label()}")
+    
+    def apply_selection(self, nodes):
+        # Seleziona esattamente i nodi indicati (e le cartelle che li contengono)
+        chosen = set(id(node) for node in nodes)
+        
+        def mark(item):
+            path, is_excluded, node = self.file_tree[item]
+            if node.is_dir:
+                selected = False
+                for child in self.tree.get_children(item):
+                    selected = mark(child) or selected
+            else:
+                selected = id(node) in chosen and not is_excluded
+            self.set_checked(item, selected)
+            return selected
+        
+        for item in self.tree.get_children():
+            mark(item)
+        self.update_selection_count()
+    
     def _select_children(self, item):
         for child in self.tree.get_children(item):
             if not self.file_tree[child][1]:  # Non selezionare file esclusi
-                self.tree.set(child, "selected", "✔️")
+                self.set_checked(child, True)
             self._select_children(child)
     
     def _deselect_children(self, item):
         for child in self.tree.get_children(item):
-            self.tree.set(child, "selected", "")
+            self.set_checked(child, False)
             self._deselect_children(child)
     
     def export_files(self):
@@ -985,10 +4058,10 @@ For more information, please refer to <https://unlicense.org/>"""
             messagebox.showerror("❌ Error", "Please select a project folder!")
             return
         
-        selected_files = []
-        self._get_selected_files("", selected_files)
+        selected_nodes = []
+        self._get_selected_nodes("", selected_nodes)
         
-        if not selected_files:
+        if not selected_nodes:
             messagebox.showwarning("⚠️ Warning", "No files selected!")
             return
         
@@ -1000,28 +4073,88 @@ For more information, please refer to <https://unlicense.org/>"""
         if not output_path:
             return
         
+        include_diffs = self.include_diffs.get() and self.git_base_ref is not None
+        if self.incremental_export.get():
+            try:
+                with self.perf.phase("export.incremental"):
+                    stats = export_incremental(selected_nodes, self.export_root(), output_path,
+                                               self.normalize_newlines.get(), self.export_transform(), self.size_limit,
+                                               self.git_diffs if include_diffs else None, self.git_base_ref)
+                self.perf.count("export.bytes_read", stats["bytes_read"])
+                self.perf.count("export.bytes_copied", stats["bytes_copied"])
+                self.perf.count("export.bytes_saved", stats["bytes_saved"])
+                self.perf.count("export.bytes_written", os.path.getsize(output_path))
+                messagebox.showinfo(
+                    "✅ Success",
+                    f"Export completed!\n{stats['reused']} files reused, {stats['read']} files read"
+                    f"{self.format_saved(stats['bytes_saved'])}{self.format_capped(selected_nodes)}\nFile saved to:\n{output_path}"
+                )
+            except Exception as e:
+                messagebox.showerror("❌ Error", f"Error during export:\n{str(e)}")
+            return
+        
+        saved_before = self.perf.counters.get("export.bytes_saved", 0)
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                for file_path in selected_files:
-                    try:
-                        f.write(f"\n\n{'='*50}\n")
-                        f.write(f"📄 FILE: {file_path.relative_to(Path(self.project_path.get()))}\n")
-                        f.write(f"{'='*50}\n\n")
-                        
-                        with open(file_path, 'r', encoding='utf-8') as source:
-                            f.write(source.read())
-                    except Exception as e:
-                        f.write(f"\n\n❌ ERROR READING FILE: {str(e)}\n")
+            with self.perf.phase("export.content"), open(output_path, 'wb') as f:
+                write_contents(
+                    f,
+                    selected_nodes,
+                    self.export_root(),
+                    self.git_diffs if include_diffs else None,
+                    self.git_base_ref,
+                    self.perf,
+                    self.normalize_newlines.get(),
+                    self.export_transform(),
+                    size_limit=self.size_limit
+                )
+            self.perf.count("export.bytes_written", os.path.getsize(output_path))
+            saved = self.format_saved(self.perf.counters.get("export.bytes_saved", 0) - saved_before)
+            capped = self.format_capped(selected_nodes)
             
-            messagebox.showinfo("✅ Success", f"Export completed!\nFile saved to:\n{output_path}")
+            messagebox.showinfo("✅ Success", f"Export completed!{saved}{capped}\nFile saved to:\n{output_path}")
         except Exception as e:
             messagebox.showerror("❌ Error", f"Error during export:\n{str(e)}")
     
-    def export_structure(self):
+    def export_transform(self):
+        return SourceTransform() if self.strip_comments.get() else None
+    
+    def format_saved(self, saved):
+        return f"\n✂️ {self.format_size(saved)} saved by stripping comments" if saved else ""
+    
+    def format_capped(self, nodes):
+        if self.size_limit is None:
+            return ""
+        capped = sum(1 for node in nodes if self.size_limit.exceeds(node))
+        return f"\n📏 {capped} files over the size limit {self.size_limit.label()}" if capped else ""
+    
+    def export_parts(self):
         if not self.project_path.get():
             messagebox.showerror("❌ Error", "Please select a project folder!")
             return
         
+        selected_nodes = []
+        self._get_selected_nodes("", selected_nodes)
+        
+        if not selected_nodes:
+            messagebox.showwarning("⚠️ Warning", "No files selected!")
+            return
+        
+        text = simpledialog.askstring(
+            "🧩 Export Parts",
+            "Maximum part size (e.g. 1MB, 100k tokens):",
+            initialvalue=self.last_part_limit,
+            parent=self.root
+        )
+        if not text:
+            return
+        
+        try:
+            limit, unit = parse_budget(text)
+        except ValueError as e:
+            messagebox.showerror("❌ Error", str(e))
+            return
+        self.last_part_limit = text
+        
         output_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
             filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
@@ -1030,52 +4163,129 @@ For more information, please refer to <https://unlicense.org/>"""
         if not output_path:
             return
         
-        try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write("PROJECT STRUCTURE\n")
-                f.write("="*50 + "\n\n")
-                
-                # Esporta la struttura completa
-                self._export_tree_structure("", f, 0)
-            
-            messagebox.showinfo("✅ Success", f"Structure exported!\nFile saved to:\n{output_path}")
-        except Exception as e:
-            messagebox.showerror("❌ Error", f"Error exporting structure:\n{str(e)}")
-    
-    def _export_tree_structure(self, parent, f, level):
-        for item in self.tree.get_children(parent):
-            file_info = self.file_tree.get(item)
-            if file_info:
-                path, is_excluded = file_info
-                name = self.tree.item(item, "text")
-                
-                # Indentazione per mostrare la gerarchia
-                indent = "  " * level
-                
-                if path.is_dir():
-                    f.write(f"{indent}📁 {name}/\n")
-                    # Ricorsione per le sottocartelle
-                    self._export_tree_structure(item, f, level + 1)
-                else:
-                    # Per i file, mostra se è selezionato o meno
-                    selected = self.tree.set(item, "selected") == "✔️"
-                    status = "✅" if selected else "❌"
-                    f.write(f"{indent}📄 {name} {status}\n")
-    
-    def _get_selected_files(self, parent, selected_list):
-        for item in self.tree.get_children(parent):
-            if self.tree.set(item, "selected") == "✔️":
-                file_path = self.file_tree.get(item)
-                if file_path and file_path[0].is_file() and not file_path[1]:  # [1] è is_excluded
-                    selected_list.append(file_path[0])
-            self._get_selected_files(item, selected_list)
+        project_root = self.export_root()
+        newlines = self.normalize_newlines.get()
+        transform = self.export_transform()
+        size_limit = self.size_limit
+        diffs = self.git_diffs if self.include_diffs.get() and self.git_base_ref is not None else None
+        diff_ref = self.git_base_ref
+        
+        def run():
+            try:
+                with self.perf.phase("export.parts"):
+                    paths, manifest_path = export_shards(selected_nodes, project_root, output_path, limit, unit,
+                                                         newlines=newlines, transform=transform, size_limit=size_limit,
+                                                         diffs=diffs, diff_ref=diff_ref)
+                self.perf.count("export.bytes_written", sum(os.path.getsize(path) for path in paths))
+                self.queue.put(("export_complete", f"Export completed in {len(paths)} parts!\nManifest saved to:\n{manifest_path}"))
+            except Exception as e:
+                self.queue.put(("error", f"Error during export:\n{str(e)}"))
+        
+        self.status_label.configure(text="💾 Exporting parts...")
+        threading.Thread(target=run, daemon=True).start()
+    
+    def export_structure(self):
+        if not self.project_path.get() or self.root_node is None:
+            messagebox.showerror("❌ Error", "Please select a project folder!")
+            return
+        
+        structure_format = simpledialog.askstring(
+            "📁 Export Structure",
+            f"Format ({', '.join(STRUCTURE_FORMATS)}):",
+            initialvalue=self.last_structure_format,
+            parent=self.root
+        )
+        if not structure_format:
+            return
+        structure_format = structure_format.strip().lower()
+        if structure_format not in STRUCTURE_FORMATS:
+            messagebox.showerror("❌ Error", f"Unknown structure format: {structure_format}")
+            return
+        self.last_structure_format = structure_format
+        
+        if structure_format == "json":
+            output_path = filedialog.asksaveasfilename(
+                defaultextension=".json",
+                filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            )
+        else:
+            output_path = filedialog.asksaveasfilename(
+                defaultextension=".txt",
+                filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+            )
+        
+        if not output_path:
+            return
+        
+        selected_nodes = []
+        self._get_selected_nodes("", selected_nodes)
+        root_node = self.root_node
+        size_limit = self.size_limit
+        
+        def run():
+            # Solo dati del modello della scansione: nessuno stat e nessuna chiamata Tk
+            try:
+                with self.perf.phase("export.structure"), open(output_path, 'w', encoding='utf-8') as f:
+                    STRUCTURE_FORMATS[structure_format](f, root_node, selected_nodes, size_limit)
+                self.queue.put(("export_complete", f"Structure exported!\nFile saved to:\n{output_path}"))
+            except Exception as e:
+                self.queue.put(("error", f"Error exporting structure:\n{str(e)}"))
+        
+        self.status_label.configure(text="📁 Exporting structure...")
+        threading.Thread(target=run, daemon=True).start()
+    
+    def _get_selected_nodes(self, parent, selected_list):
+        # File spuntati sotto parent, nell'ordine della Treeview, letti dal modello
+        # della scansione senza una chiamata Tk per elemento
+        node = self.root_node if parent == "" else self.file_tree[parent][2]
+        if node is None:
+            return
+        checked = self.checked_nodes
+        selected_list.extend(child for child in iter_files(node) if child in checked and not child.is_excluded)
 
 if __name__ == "__main__":
+    # Modalità batch senza interfaccia: --batch jobs.json [--report report.json] [--workers N]
+    if "--batch" in sys.argv:
+        import argparse
+        parser = argparse.ArgumentParser(description="Run Code Exporter batch export jobs")
+        parser.add_argument("--batch", required=True, metavar="JOB_FILE", help="JSON file listing the export jobs")
+        parser.add_argument("--report", help="summary report path (default: <job file>.report.json)")
+        parser.add_argument("--workers", type=int, help="number of worker processes (default: CPU count)")
+        args = parser.parse_args()
+        report = run_batch(args.batch, args.report, args.workers)
+        sys.exit(1 if report["jobs_failed"] else 0)
+    
+    # Server locale con cache delle scansioni: --serve [--port 8765] [--cache-size 8]
+    if "--serve" in sys.argv:
+        import argparse
+        parser = argparse.ArgumentParser(description="Serve Code Exporter exports over localhost HTTP")
+        parser.add_argument("--serve", action="store_true", required=True, help="start the export server")
+        parser.add_argument("--port", type=int, default=8765, help="port on 127.0.0.1 (default: 8765)")
+        parser.add_argument("--cache-size", type=int, default=8, help="scanned trees kept in memory (default: 8)")
+        args = parser.parse_args()
+        serve_exports(args.port, args.cache_size)
+        sys.exit(0)
+    
+    if tk is None:
+        print("tkinter non è installato: l'interfaccia non è disponibile (usa --batch o --serve).")
+        sys.exit(1)
+    
     # Usa customtkinter se disponibile, altrimenti usa tkinter standard
-    if CUSTOMTKINTER_AVAILABLE:
+    try:
+        import customtkinter as ctk
         root = ctk.CTk()
-    else:
+    except ImportError:
+        print("customtkinter non è installato. Usa 'pip install customtkinter' per installarlo.")
+        print("Eseguendo con tkinter standard...")
         root = tk.Tk()
     
     app = CodeExporterApp(root)
+    
+    # --measure-startup stampa i tempi di avvio in JSON ed esce
+    if "--measure-startup" in sys.argv:
+        def report_startup(times):
+            print(json.dumps(times, indent=2))
+            root.destroy()
+        app.startup_callbacks.append(report_startup)
+    
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,223 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_exporter import (
+    ProjectScanner, ScanRules, SelectionProfile, SizeLimit, SourceTransform, _split_boundaries,
+    export_incremental, export_shards, git_diff_path, git_unquote, iter_files, iter_relative_files,
+    to_utf8, write_contents
+)
+
+
+def scan(root, **rules):
+    scanner = ProjectScanner(ScanRules(**rules))
+    root_node = scanner.build_tree(root)[0]
+    return scanner, root_node, [node for node in iter_files(root_node) if not node.is_excluded]
+
+def write_files(root, files):
+    for relative, data in files.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+# to_utf8
+
+def test_to_utf8_ascii_passes_through():
+    assert to_utf8(b"print('ciao')\n") == (b"print('ciao')\n", 'ascii')
+
+def test_to_utf8_utf16_without_bom():
+    assert to_utf8('ciao mondo'.encode('utf-16-le')) == (b'ciao mondo', 'utf-16-le')
+    assert to_utf8('ciao mondo'.encode('utf-16-be')) == (b'ciao mondo', 'utf-16-be')
+
+def test_to_utf8_bom():
+    assert to_utf8(b'\xef\xbb\xbfx = 1\n') == (b'x = 1\n', 'ascii')
+    assert to_utf8(b'\xff\xfe' + 'caffè'.encode('utf-16-le')) == ('caffè'.encode('utf-8'), 'utf-16-le')
+
+def test_to_utf8_fallback_encoding():
+    data, encoding = to_utf8('caffè'.encode('cp1252'))
+    assert data == 'caffè'.encode('utf-8')
+    assert encoding != 'utf-8'
+
+
+# SourceTransform.apply
+
+def test_strip_python_comments_keeps_strings():
+    source = b'x = "# not a comment"  # comment\n# whole line\ny = 2\n'
+    assert SourceTransform().apply(source, '.py') == b'x = "# not a comment"\ny = 2\n'
+
+def test_strip_keeps_shebang_and_drops_license():
+    source = b'#!/usr/bin/env python\n# Copyright 2020 Someone\nimport os\n'
+    assert SourceTransform().apply(source, '.py') == b'#!/usr/bin/env python\nimport os\n'
+
+def test_strip_keeps_crlf_line_endings():
+    source = b'x = 1 # c\r\n# whole line\r\ny = 2   \r\n\r\n\r\n\r\nz = 3\r\n'
+    assert SourceTransform().apply(source, '.py') == b'x = 1\r\ny = 2\r\n\r\nz = 3\r\n'
+
+def test_strip_javascript_regex_literals():
+    source = b'const u = /https?:\\/\\//; // c\nconst r = [/a\\/b/g, /[/*]/];\nreturn /x\\/\\//.test(s) /* d */\n'
+    assert SourceTransform().apply(source, '.js') == (
+        b'const u = /https?:\\/\\//;\nconst r = [/a\\/b/g, /[/*]/];\nreturn /x\\/\\//.test(s)\n'
+    )
+
+def test_strip_javascript_division_is_not_a_regex():
+    assert SourceTransform().apply(b'let x = a / b; // c\n', '.js') == b'let x = a / b;\n'
+
+def test_drop_license_only():
+    source = b'// Copyright 2020 Someone\r\n// MIT License\r\nint x; // kept\r\n'
+    transform = SourceTransform(strip_comments=False, collapse_whitespace=False)
+    assert transform.apply(source, '.c') == b'int x; // kept\r\n'
+
+def test_markdown_keeps_hard_break_spaces():
+    source = b'line  \nnext <!-- c -->\n\n\n\nend\n'
+    assert SourceTransform().apply(source, '.md') == b'line  \nnext\n\nend\n'
+
+def test_unknown_extension_is_unchanged():
+    source = b'# not touched  \n\n\n\n'
+    assert SourceTransform().apply(source, '.unknown') == source
+
+
+# SizeLimit.parse
+
+def test_size_limit_parse():
+    for text, max_bytes, mode in (("1MB", 1024 ** 2, "sample"), ("1 MB", 1024 ** 2, "sample"),
+                                  ("500 KB truncate", 500 * 1024, "truncate"), ("2mb SKIP", 2 * 1024 ** 2, "skip")):
+        limit = SizeLimit.parse(text)
+        assert (limit.max_bytes, limit.mode) == (max_bytes, mode)
+
+def test_size_limit_parse_errors():
+    for text in ("", "1MB bogus", "100 tokens"):
+        with pytest.raises(ValueError):
+            SizeLimit.parse(text)
+
+def test_size_limit_text_round_trip():
+    for limit in (SizeLimit(500), SizeLimit(1024 ** 2, "skip"), SizeLimit(1536, "truncate")):
+        parsed = SizeLimit.parse(limit.to_text())
+        assert (parsed.max_bytes, parsed.mode) == (limit.max_bytes, limit.mode)
+
+
+# export_incremental
+
+def full_export(nodes, root, path):
+    with open(path, 'wb') as f:
+        write_contents(f, nodes, root, max_workers=1)
+    return path.read_bytes()
+
+def test_incremental_matches_full_export(tmp_path):
+    project = tmp_path / "project"
+    write_files(project, {"a.py": b"a = 1\n", "b.py": b"b = 2\n", "c.py": b"c = 3\n", "sub/d.py": b"d = 4\n"})
+    output = tmp_path / "out.txt"
+
+    stats = export_incremental(scan(project)[2], project, str(output))
+    assert stats["read"] == 4
+    assert output.read_bytes() == full_export(scan(project)[2], project, tmp_path / "full.txt")
+
+    # Nessuna modifica: tutto viene copiato dal vecchio output
+    stats = export_incremental(scan(project)[2], project, str(output))
+    assert (stats["reused"], stats["read"]) == (4, 0)
+    assert output.read_bytes() == full_export(scan(project)[2], project, tmp_path / "full.txt")
+
+    # Un file modificato (stessa dimensione, mtime diverso), uno cancellato e uno nuovo
+    (project / "b.py").write_bytes(b"b = 9\n")
+    os.utime(project / "b.py", ns=(1, 1))
+    (project / "c.py").unlink()
+    write_files(project, {"sub/e.py": b"e = 5\n"})
+    stats = export_incremental(scan(project)[2], project, str(output))
+    assert (stats["files"], stats["reused"], stats["read"]) == (4, 2, 2)
+    assert output.read_bytes() == full_export(scan(project)[2], project, tmp_path / "full.txt")
+
+
+# _split_boundaries
+
+def test_split_boundaries_prefers_newlines():
+    assert _split_boundaries(b"aaaa\nbbbb\ncccc\n", 8) == [0, 5, 10, 15]
+
+def test_split_boundaries_keeps_utf8_characters():
+    data = "è€".encode('utf-8') * 20
+    boundaries = _split_boundaries(data, 7)
+    assert boundaries[0] == 0 and boundaries[-1] == len(data)
+    for start, end in zip(boundaries, boundaries[1:]):
+        assert 0 < end - start <= 7
+        data[start:end].decode('utf-8')
+
+
+# export_shards
+
+def test_shards_are_utf8_and_within_limit(tmp_path):
+    project = tmp_path / "project"
+    write_files(project, {
+        "big.txt": "caffè €\n".encode('utf-8') * 200 + "senza a capo è".encode('utf-8') * 100,
+        "latin.txt": "perché\r\n".encode('latin-1') * 50,
+        "small.py": b"x = 1\n"
+    })
+    limit = 1000
+    paths, manifest_path = export_shards(scan(project)[2], project, str(tmp_path / "parts.txt"), limit, max_workers=1)
+    assert len(paths) > 1
+    for path in paths:
+        data = open(path, 'rb').read()
+        assert len(data) <= limit
+        assert b"\r" not in data
+        data.decode('utf-8')
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert [part["file"] for part in manifest["parts"]] == [os.path.basename(path) for path in paths]
+
+def test_shards_reject_limit_smaller_than_header(tmp_path):
+    project = tmp_path / "project"
+    write_files(project, {"a.py": b"a = 1\n" * 100})
+    with pytest.raises(ValueError):
+        export_shards(scan(project)[2], project, str(tmp_path / "parts.txt"), 50, max_workers=1)
+
+
+# ProjectScanner: symlink e hardlink
+
+def test_scan_prunes_symlink_cycles_and_hardlinks(tmp_path):
+    write_files(tmp_path, {"src/a.py": b"a = 1\n"})
+    try:
+        os.symlink("..", str(tmp_path / "src" / "loop"))
+        os.link(str(tmp_path / "src" / "a.py"), str(tmp_path / "src" / "b.py"))
+    except (OSError, NotImplementedError):
+        pytest.skip("symlink or hardlink not supported")
+
+    scanner, root_node, nodes = scan(tmp_path)
+    assert [relative for relative, node in iter_relative_files(root_node)] == ["src/a.py"]
+    assert scanner.link_stats == {"symlinks_skipped": 0, "cycles": 1, "duplicates": 1}
+    assert scanner.count_files(tmp_path) == 1
+
+    scanner = scan(tmp_path, follow_symlinks=False)[0]
+    assert scanner.link_stats == {"symlinks_skipped": 1, "cycles": 0, "duplicates": 1}
+
+
+# Percorsi nei diff di git
+
+def test_git_diff_path_with_spaces():
+    assert git_diff_path("diff --git a/src/my file.py b/src/my file.py") == "src/my file.py"
+    assert git_diff_path("diff --git a/a.py b/a.py") == "a.py"
+
+def test_git_diff_path_quoted():
+    assert git_diff_path('diff --git "a/tab\\there.py" "b/tab\\there.py"') == "tab\there.py"
+    assert git_diff_path('diff --git "a/caff\\303\\250.py" "b/caff\\303\\250.py"') == "caffè.py"
+
+def test_git_unquote():
+    assert git_unquote("plain.py") == "plain.py"
+    assert git_unquote('"say \\"hi\\".py"') == 'say "hi".py'
+
+
+# SelectionProfile.match
+
+def test_profile_exclude_applies_to_explicit_paths(tmp_path):
+    write_files(tmp_path, {"src/a.py": b"", "src/a_test.py": b"", "docs/b.md": b""})
+    root_node = scan(tmp_path)[1]
+    profile = SelectionProfile.from_selection(root_node, list(iter_files(root_node)), ["src/*.py"], ["*_test.py"])
+    assert sorted(node.name for node in profile.match(root_node)) == ["a.py", "b.md"]
+
+def test_profile_name_and_path_patterns(tmp_path):
+    write_files(tmp_path, {"src/a.py": b"", "src/sub/c.py": b"", "docs/b.md": b""})
+    root_node = scan(tmp_path)[1]
+    assert sorted(node.name for node in SelectionProfile(["*.md"]).match(root_node)) == ["b.md"]
+    assert sorted(node.name for node in SelectionProfile(["src/*"], ["sub/*"]).match(root_node)) == ["a.py", "c.py"]
+    assert sorted(node.name for node in SelectionProfile(["src/*"], ["src/sub/*"]).match(root_node)) == ["a.py"]